@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+
+# Canonical form of ci-type-groups report: the same data gives the same report regardless of rows order in DB
+
+import hashlib
+import json
+from operator import itemgetter
+
+def _normalize_text(value):
+    """
+    Strip and collapse whitespace
+    :param str value: text to normalize
+    :return str: normalized text
+    """
+    return " ".join(value.split()) if isinstance(value, str) else value
+
+def _group_key(group):
+    """
+    Sorting key for groups: by code, the group of non-groupped types is the last one
+    :param dict group: group dictionary
+    :return tuple: key
+    """
+    return (not group.get("code"), group.get("code"))
+
+def make_canonical_report(report):
+    """
+    Sort groups, types and regexps by code, remove blank regexps, normalize whitespace in display names.
+    Codes and regexps are kept as they are in DB. Report is modified in place.
+    :param list report: ci-type-groups report
+    :return list: the same report, canonical
+    """
+    _code = itemgetter("code")
+
+    for _group in report:
+        _group["name"] = _normalize_text(_group.get("name"))
+
+        for _type in _group.get("types"):
+            _type["name"] = _normalize_text(_type.get("name"))
+            _type["regexp"] = sorted(filter(lambda x: x and x.strip(), _type.get("regexp")))
+
+        _group.get("types").sort(key=_code)
+
+    report.sort(key=_group_key)
+    return report
+
+def get_report_digest(report):
+    """
+    Return stable digest of the report, to be used as cache key
+    :param list report: ci-type-groups report, canonical
+    :return str: hexadecimal SHA-256 digest
+    """
+    return hashlib.sha256(json.dumps(report, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, unquote
+from .canonical_report import get_report_digest
+
+class Catalogue:
+    def __init__(self, report, fingerprint=None):
+        """
+        In-memory catalogue of groups and types, indexed for lookups
+        :param list report: ci-type-groups report
+        :param str fingerprint: DB fingerprint the report was built for
+        """
+        self.report = report
+        self.fingerprint = fingerprint
+        self.built = time.monotonic()
+        self.types = dict()
+        self.groups = dict()
+        self.regexps = dict()
+
+        for _group in report:
+            _group_code = _group.get("code")
+
+            if _group_code:
+                self.groups[_group_code] = {"code": _group_code, "name": _group.get("name"),
+                        "types": [_type.get("code") for _type in _group.get("types")]}
+
+            for _type in _group.get("types"):
+                _type_dict = self.types.get(_type.get("code"))
+
+                if not _type_dict:
+                    _type_dict = dict((_k, _v) for _k, _v in _type.items() if _k != "rowspan")
+                    _type_dict["groups"] = list()
+                    self.types[_type_dict.get("code")] = _type_dict
+
+                    # regexps are not deduplicated in the report
+                    for _regexp in sorted(set(_type_dict.get("regexp"))):
+                        self.regexps.setdefault(_regexp, list()).append(_type_dict.get("code"))
+
+                if _group_code:
+                    _type_dict["groups"].append(_group_code)
+
+        self.etag = '"%s"' % get_report_digest(report)
+        # the whole catalogue is the largest reply, serialized once
+        self.data = json.dumps(report).encode("utf-8")
+
+class CatalogueServer:
+    def __init__(self, loader, fingerprinter, ttl=600, check_interval=60, address=("", 8080)):
+        """
+        Read-only HTTP JSON API serving the catalogue from memory
+        :param loader: callable returning ci-type-groups report
+        :param fingerprinter: callable returning DB fingerprint, catalogue is reloaded when it changes
+        :param float ttl: catalogue is reloaded when older than this, seconds
+        :param float check_interval: DB fingerprint check interval, seconds
+        :param tuple address: host and port to listen on
+        """
+        self._loader = loader
+        self._fingerprinter = fingerprinter
+        self._ttl = ttl
+        self._check_interval = check_interval
+        self._address = address
+        self._stop = threading.Event()
+        self._server = None
+        self._threads = list()
+        self.catalogue = None
+
+    @property
+    def url(self):
+        return "http://%s:%d/" % self._server.server_address
+
+    def refresh(self, force=False):
+        """
+        Reload catalogue if it is expired or DB fingerprint has changed
+        :param bool force: reload anyway
+        :return bool: whether catalogue was reloaded
+        """
+        _fingerprint = self._fingerprinter()
+        _current = self.catalogue
+
+        if not force and _current and _current.fingerprint == _fingerprint:
+            if time.monotonic() - _current.built < self._ttl:
+                return False
+
+            logging.info("Catalogue is expired")
+        else:
+            logging.info("DB fingerprint: %s" % _fingerprint)
+
+        _started = time.monotonic()
+        # replacing the reference only, requests being served keep the previous catalogue
+        self.catalogue = Catalogue(self._loader(), _fingerprint)
+        logging.info("Catalogue loaded in %.3f s: %d groups, %d types, %d regexps" % (
+            time.monotonic() - _started, len(self.catalogue.groups), len(self.catalogue.types),
+            len(self.catalogue.regexps)))
+        return True
+
+    def _refresh_loop(self):
+        """
+        Background refresh until stopped
+        """
+        while not self._stop.wait(self._check_interval):
+            try:
+                self.refresh()
+            except Exception as _e:
+                # keep serving the previous catalogue
+                logging.exception(_e)
+
+    def start(self):
+        """
+        Load catalogue and start serving in background threads
+        """
+        self.refresh(force=True)
+        self._server = ThreadingHTTPServer(self._address, self._make_handler())
+        self._server.daemon_threads = True
+        logging.info("Serving catalogue at: %s" % self.url)
+        self._stop.clear()
+        self._threads = [threading.Thread(target=self._server.serve_forever, daemon=True),
+                threading.Thread(target=self._refresh_loop, daemon=True)]
+
+        for _thread in self._threads:
+            _thread.start()
+
+        return self
+
+    def stop(self):
+        """
+        Stop serving and refreshing
+        """
+        self._stop.set()
+        self._server.shutdown()
+        self._server.server_close()
+
+        for _thread in self._threads:
+            _thread.join()
+
+    def serve_forever(self):
+        """
+        Serve until interrupted
+        """
+        self.start()
+
+        try:
+            self._stop.wait()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def lookup(self, path, params):
+        """
+        Find object requested
+        :param str path: request path
+        :param dict params: request query parameters
+        :return tuple: status code, object to reply with, catalogue used
+        """
+        _catalogue = self.catalogue
+        _parts = list(filter(None, path.split("/")))
+
+        if _parts == ["catalogue"]:
+            return 200, _catalogue.report, _catalogue
+
+        if _parts == ["types"]:
+            return 200, sorted(_catalogue.types.keys()), _catalogue
+
+        if _parts == ["groups"]:
+            return 200, sorted(_catalogue.groups.keys()), _catalogue
+
+        if len(_parts) == 2 and _parts[0] in ["types", "groups"]:
+            _result = getattr(_catalogue, _parts[0]).get(unquote(_parts[1]))
+
+            if _result is None:
+                return 404, {"message": "Not found: %s" % _parts[1]}, _catalogue
+
+            return 200, _result, _catalogue
+
+        if _parts == ["regexps"] and params.get("regexp"):
+            _result = _catalogue.regexps.get(params.get("regexp"))
+
+            if _result is None:
+                return 404, {"message": "Not found: %s" % params.get("regexp")}, _catalogue
+
+            return 200, {"regexp": params.get("regexp"), "types": _result}, _catalogue
+
+        return 404, {"message": "Not found: %s" % path}, _catalogue
+
+    def _make_handler(self):
+        _server = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, message_format, *args):
+                logging.debug(message_format % args)
+
+            def do_GET(self):
+                _url = urlparse(self.path)
+                _params = dict((_k, _v[0]) for _k, _v in parse_qs(_url.query).items())
+                _status_code, _obj, _catalogue = _server.lookup(_url.path, _params)
+
+                if _status_code == 200 and self.headers.get("If-None-Match") == _catalogue.etag:
+                    self.send_response(304)
+                    self.send_header("ETag", _catalogue.etag)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                _data = _catalogue.data if _obj is _catalogue.report else json.dumps(_obj).encode("utf-8")
+                self.send_response(_status_code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(_data)))
+
+                if _status_code == 200:
+                    self.send_header("ETag", _catalogue.etag)
+
+                self.end_headers()
+                self.wfile.write(_data)
+
+        return _Handler
@@ -3,14 +3,55 @@
 import argparse
 import logging
 import os
-from urllib.parse import urljoin
+from urllib.parse import urljoin, urlparse
 from oc_orm_initializator.orm_initializator import OrmInitializator
 import jinja2
 import pkg_resources
 import posixpath
 import requests
-from copy import copy
+from copy import copy, deepcopy
 import json
+import gzip
+import hashlib
+import io
+from concurrent.futures import ThreadPoolExecutor
+from .profiling import PhaseProfiler
+from .table_renderer import render_groups_table
+from .catalogue_server import CatalogueServer
+from .canonical_report import make_canonical_report, get_report_digest
+
+# version of the report format, increase it on template or report structure changes
+REPORT_SCHEMA_VERSION = 1
+
+class _ModelsOnDatabase:
+    """
+    Proxy for models module routing all the model managers to a database alias given
+    """
+    def __init__(self, models, using):
+        """
+        :param django.Models models: database models
+        :param str using: django database alias
+        """
+        self._models = models
+        self._using = using
+
+    def __getattr__(self, name):
+        return _ModelOnDatabase(getattr(self._models, name), self._using)
+
+class _ModelOnDatabase:
+    """
+    Proxy for a model with 'objects' manager bound to a database alias given
+    """
+    def __init__(self, model, using):
+        self._model = model
+        self._using = using
+
+    def __getattr__(self, name):
+        return getattr(self._model, name)
+
+    @property
+    def objects(self):
+        return self._model.objects.db_manager(self._using)
 
 class CiTypesSync:
     def __init__(self):
@@ -19,6 +60,8 @@ class CiTypesSync:
         """
         self._args = None
         self._orm_initialization_done = False
+        self._profiler = None
+        self._db_fingerprint = None
 
     def _do_orm_initialization(self):
         """
@@ -47,6 +90,9 @@ class CiTypesSync:
 
         parser.add_argument("--psql-url", dest="psql_url", help="PSQL URL, including schema path", 
                 default=os.getenv("PSQL_URL"))
+        parser.add_argument("--psql-compare-url", dest="psql_compare_urls", nargs="+",
+                help="Additional PSQL URL(s), including schema path, to check for consistency with the main one",
+                default=list(filter(None, os.getenv("PSQL_COMPARE_URLS", "").split())))
         parser.add_argument("--psql-user", dest="psql_user", help="PSQL user",
                 default=os.getenv("PSQL_USER"))
         parser.add_argument("--psql-password", dest="psql_password", help="PSQL password",
@@ -68,6 +114,26 @@ class CiTypesSync:
         parser.add_argument("--log-level", dest="log_level", help = "Log level", type=int, default=20)
         parser.add_argument("--out", dest="fn_out", 
                 help="Write output to local file specified here, do not put to Confluence", type=str)
+        parser.add_argument("--page-property", dest="page_property",
+                help="Confluence (WIKI) page content property key to keep published report hash in",
+                default="oc-ci-types-sync")
+        parser.add_argument("--regexp-attachment", dest="regexp_attachment", type=str,
+                help="Publish compact table with regexps counts only, upload full regexps catalogue "
+                "as gzipped JSON page attachment with the name specified here",
+                default=os.getenv("REGEXP_ATTACHMENT"))
+        parser.add_argument("--fast-render", dest="fast_render", action="store_true",
+                help="Render groups and types table natively, page template should support 'groups_table' variable")
+        parser.add_argument("--serve-port", dest="serve_port", type=int,
+                help="Do not publish the report, serve it as read-only HTTP JSON API on the port specified here")
+        parser.add_argument("--serve-ttl", dest="serve_ttl", type=float, default=600,
+                help="Served report is reloaded when older than this, seconds")
+        parser.add_argument("--serve-check-interval", dest="serve_check_interval", type=float, default=60,
+                help="Interval of DB fingerprint checks for served report reloading, seconds")
+        parser.add_argument("--digest", dest="digest", action="store_true",
+                help="Do not publish the report, print its stable digest only (for cache keys and monitoring)")
+        parser.add_argument("--profile", dest="profile", type=str,
+                help="Profile run phases (CPU and memory allocations), write results to directory specified here. "
+                "With compare URLs, report extraction is profiled for each source separately")
 
         return parser
 
@@ -170,6 +236,153 @@ class CiTypesSync:
         _group_dict["rowspan"] = self._get_group_rows(_group_dict)
         _result.append(_group_dict)
 
+        # rows order from DB is not guaranteed
+        return make_canonical_report(_result)
+
+    def _get_db_fingerprint(self, models):
+        """
+        Return cheap fingerprint of the data: rows count and maximal primary key for each table of the report.
+        In-place updates of rows are not detected by it.
+        :param django.Models models: database models
+        :return str: fingerprint
+        """
+        from django.db.models import Count, Max
+        _fingerprint = list()
+
+        for _model_name in ["CiTypeGroups", "CiTypes", "CiTypeIncs", "CiRegExp"]:
+            _aggregate = getattr(models, _model_name).objects.aggregate(count=Count("pk"), max=Max("pk"))
+            _fingerprint.append([_model_name, _aggregate.get("count"), _aggregate.get("max")])
+
+        return hashlib.sha256(json.dumps(_fingerprint).encode("utf-8")).hexdigest()
+
+    def _parse_psql_url(self, url):
+        """
+        Parse PSQL URL in the same format as the main one
+        :param str url: PSQL URL, including schema path
+        :return dict: django database settings to override: HOST, PORT, NAME and OPTIONS
+        """
+        if "//" not in url:
+            url = "//" + url
+
+        _parsed = urlparse(url)
+
+        if not all([_parsed.hostname, _parsed.path.strip(posixpath.sep), _parsed.query]):
+            raise ValueError("Invalid PSQL URL: '%s'. Host, dbname and options are required" % url)
+
+        return {"HOST": _parsed.hostname, "PORT": _parsed.port or 5432, "NAME": _parsed.path.strip(posixpath.sep),
+                "OPTIONS": {"options": "-c " + _parsed.query}}
+
+    def _get_sources(self):
+        """
+        Register additional databases to compare with the main one
+        :return dict: database aliases by source label, the main source goes first
+        """
+        from django.db import connections
+        _sources = {self._args.psql_url: "default"}
+
+        for _url in self._args.psql_compare_urls or list():
+            if _url in _sources:
+                continue
+
+            _alias = "compare_%d" % len(_sources)
+            # the same credentials and engine settings as the main database
+            _settings = deepcopy(connections.databases["default"])
+            _settings.update(self._parse_psql_url(_url))
+            connections.databases[_alias] = _settings
+            logging.debug("Database '%s' registered for '%s'" % (_alias, _url))
+            _sources[_url] = _alias
+
+        return _sources
+
+    def _get_source_report(self, models, alias):
+        """
+        Get report from one database, to be run in a separate thread
+        :param django.Models models: database models
+        :param str alias: django database alias
+        :return list: report
+        """
+        from django.db import connections
+
+        try:
+            # profiled per source: extraction runs in worker threads which are not seen by the caller's profile
+            return self._call_phase("get_citype_groups-%s" % alias, self._get_citype_groups,
+                    _ModelsOnDatabase(models, alias))
+        finally:
+            # connections are thread-local, do not leave them behind the worker
+            connections[alias].close()
+
+    def _get_source_reports(self, models, sources):
+        """
+        Get reports from all sources concurrently, each on its own connection
+        :param django.Models models: database models
+        :param dict sources: database aliases by source label
+        :return dict: reports by source label, in the order of sources
+        """
+        with ThreadPoolExecutor(max_workers=len(sources)) as _executor:
+            _futures = dict((_label, _executor.submit(self._get_source_report, models, _alias))
+                    for _label, _alias in sources.items())
+
+            return dict((_label, _future.result()) for _label, _future in _futures.items())
+
+    def _index_report(self, report):
+        """
+        Index report for comparison
+        :param list report: ci-type-groups report
+        :return tuple: set of group codes, dict of types by code with sets of group codes and regexps
+        """
+        _groups = set()
+        _types = dict()
+
+        for _group in report:
+            if _group.get("code"):
+                _groups.add(_group.get("code"))
+
+            for _type in _group.get("types"):
+                _type_index = _types.setdefault(_type.get("code"), {"groups": set(), "regexp": set()})
+                _type_index["regexp"].update(_type.get("regexp"))
+
+                if _group.get("code"):
+                    _type_index["groups"].add(_group.get("code"))
+
+        return _groups, _types
+
+    def _compare_reports(self, reports):
+        """
+        Compare reports from different sources with the first one
+        :param dict reports: reports by source label, reference goes first
+        :return list: differences for each source except the reference one
+        """
+        _reference, _reference_report = next(iter(reports.items()))
+        _reference_groups, _reference_types = self._index_report(_reference_report)
+        _result = list()
+
+        for _schema, _report in list(reports.items())[1:]:
+            _groups, _types = self._index_report(_report)
+            _rows = list()
+
+            for _kind, _reference_codes, _codes in [
+                    ("Groups", _reference_groups, _groups),
+                    ("Types", set(_reference_types.keys()), set(_types.keys()))]:
+                if _reference_codes != _codes:
+                    _rows.append({"kind": _kind, "code": "",
+                        "missing": sorted(_reference_codes - _codes), "extra": sorted(_codes - _reference_codes)})
+
+            for _code in sorted(set(_reference_types.keys()) & set(_types.keys())):
+                for _kind, _key in [("Type groups", "groups"), ("Type regexps", "regexp")]:
+                    _reference_values = _reference_types[_code][_key]
+                    _values = _types[_code][_key]
+
+                    if _reference_values != _values:
+                        _rows.append({"kind": _kind, "code": _code,
+                            "missing": sorted(_reference_values - _values), "extra": sorted(_values - _reference_values)})
+
+            if _rows:
+                logging.warning("Found '%d' differences of '%s' from '%s'" % (len(_rows), _schema, _reference))
+            else:
+                logging.info("No differences of '%s' from '%s'" % (_schema, _reference))
+
+            _result.append({"reference": _reference, "schema": _schema, "rows": _rows})
+
         return _result
 
     def _render_template(self, report):
@@ -181,16 +394,54 @@ class CiTypesSync:
         _loader = jinja2.FileSystemLoader(os.path.dirname(self._args.page_template))
         _env = jinja2.Environment(loader=_loader)
         _template = _env.get_template(os.path.basename(self._args.page_template))
+
+        if self._args.fast_render:
+            # table rows are the heaviest part for Jinja2 runtime, inject them pre-rendered
+            report = dict(report, groups_table=render_groups_table(
+                report.get("groups"), report.get("regexp_attachment")))
+
         _report = _template.render(report)
 
         return _report
 
-    def _make_context(self, report):
+    def _make_context(self, report, consistency=None):
         """
         Return context for template rendering
+        :param list report: ci-type-groups report
+        :param list consistency: differences between schemas, if compared
         :return dict: context for rendering
         """
-        return {"mvn_prefix": self._args.mvn_prefix, "groups": report}
+        _context = {"mvn_prefix": self._args.mvn_prefix, "groups": report}
+
+        if consistency is not None:
+            _context["consistency"] = consistency
+
+        if self._args.regexp_attachment:
+            _context["regexp_attachment"] = self._args.regexp_attachment
+
+        return _context
+
+    def _make_regexp_catalogue(self, report):
+        """
+        Make full regexps catalogue to be published as page attachment
+        :param list report: ci-type-groups report
+        :return dict: attachment 'filename', gzipped JSON 'data' and 'hash' of uncompressed content
+        """
+        _catalogue = dict()
+
+        for _group in report:
+            for _type in _group.get("types"):
+                _catalogue[_type.get("code")] = list(_type.get("regexp"))
+
+        _content = json.dumps(_catalogue, sort_keys=True, indent=1).encode("utf-8")
+        _data = io.BytesIO()
+
+        # zero mtime to get the same compressed data for the same content
+        with gzip.GzipFile(fileobj=_data, mode="wb", mtime=0) as _gz:
+            _gz.write(_content)
+
+        return {"filename": self._args.regexp_attachment, "data": _data.getvalue(),
+                "hash": hashlib.sha256(_content).hexdigest()}
 
     def _get_confluence_page_id(self):
         """
@@ -210,15 +461,15 @@ class CiTypesSync:
         logging.info("Page '%s' id: %s" % (_rq_parms.get("title"), _page_id))
         return _page_id
 
-    def _get_page_current_content(self, page_id):
+    def _get_page_state(self, page_id):
         """
-        Get current page content by id
-        :param str page_id: confluence page_id
-        :return dict:
+        Return page object with version and report marker property, without the page body
+        :param str page_id: Confluence page id
+        :return dict: page object from Confluence
         """
-        _rq_url = urljoin(self._args. wiki_url, posixpath.join("rest", "api", "content", page_id))
+        _rq_url = urljoin(self._args.wiki_url, posixpath.join("rest", "api", "content", page_id))
         logging.debug("RQ URL: '%s'" % _rq_url)
-        _rq_parms = {"expand": "body.storage"}
+        _rq_parms = {"expand": "version,metadata.properties.%s" % self._args.page_property}
         _headers = {"Content-type": "application/json"}
         _resp = requests.get(_rq_url, params=_rq_parms, headers=_headers,
                 auth=(self._args.wiki_user, self._args.wiki_password))
@@ -228,57 +479,77 @@ class CiTypesSync:
 
         return _resp.json()
 
-    def _get_page_new_version(self, page_id):
+    def _make_report_marker(self, report):
+        """
+        Return marker of the report to keep in page content property
+        :param str report: rendered XHTML report
+        :return dict: marker
         """
-        Return current page version from Confluence
+        return {"hash": hashlib.sha256(report.encode("utf-8")).hexdigest(),
+                "schema": REPORT_SCHEMA_VERSION,
+                "db": self._db_fingerprint}
+
+    def _get_page_property(self, page):
+        """
+        Return page content property used for report marker
+        :param dict page: page object from Confluence, with properties expanded
+        :return dict: property object, with version, None if absent
+        """
+        return ((page.get("metadata") or dict()).get("properties") or dict()).get(self._args.page_property)
+
+    def _get_page_marker(self, page):
+        """
+        Return marker of the published report
+        :param dict page: page object from Confluence, with properties expanded
+        :return dict: marker, None if absent
+        """
+        _marker = (self._get_page_property(page) or dict()).get("value")
+        logging.debug("Page '%s' marker: %s" % (page.get("id"), _marker))
+        return _marker
+
+    def _put_page_property(self, page_id, marker, current=None):
+        """
+        Save report marker to page content property, creating it or incrementing its version
         :param str page_id: Confluence page id
-        :return str: current page version
+        :param dict marker: report marker
+        :param dict current: current property object, None if absent
         """
-        _rq_url = urljoin(self._args. wiki_url, posixpath.join("rest", "api", "content", page_id))
+        _rq_path = posixpath.join("rest", "api", "content", page_id, "property")
+        _property = {"key": self._args.page_property, "value": marker}
+        _method = requests.post
+
+        if current:
+            _rq_path = posixpath.join(_rq_path, self._args.page_property)
+            _property["version"] = {"number": int(current.get("version").get("number")) + 1, "minorEdit": True}
+            _method = requests.put
+
+        _rq_url = urljoin(self._args.wiki_url, _rq_path)
         logging.debug("RQ URL: '%s'" % _rq_url)
-        _rq_parms = {"expand": "version.number"}
         _headers = {"Content-type": "application/json"}
-        _resp = requests.get(_rq_url, params=_rq_parms, headers=_headers,
-                auth=(self._args.wiki_user, self._args.wiki_password))
+        _resp = _method(_rq_url, headers=_headers,
+                auth=(self._args.wiki_user, self._args.wiki_password), data=json.dumps(_property))
+        logging.info("Page '%s' property '%s' save status code: '%d'" % (
+            page_id, self._args.page_property, _resp.status_code))
 
         if _resp.status_code < 200  or _resp.status_code >= 300:
             _resp.raise_for_status()
 
-        _version = _resp.json().get("version").get("number")
-        _version = str(int(_version) + 1)
-        logging.info("New version number: %s" % _version)
-        return _version
-
     def _make_new_page_object(self, current_content, new_version, new_content):
         """
         Construct dict (JSONized) page object to put to Confluence
-        :param dict current_content: current page object from Confluence
+        :param dict current_content: current page object from Confluence, body is not necessary
         :param str new_version: new page version
         :param str new_content: new page content, XHTML, without metadata
         """
 
-        _keys_n = ['id', 'type', 'title', 'status', 'body', 'version']
+        _keys_n = ['id', 'type', 'title', 'status']
         _keys_p = copy(list(current_content.keys()))
         _keys_p = list(filter(lambda x: x not in _keys_n, _keys_p))
 
         for _k in _keys_p:
             del(current_content[_k])
 
-        _keys_n = ['storage']
-        _keys_p = copy(list(current_content.get('body').keys()))
-        _keys_p = list(filter(lambda x: x not in _keys_n, _keys_p))
-
-        for _k in _keys_p:
-            del(current_content['body'][_k])
-
-        _keys_n = ['value', 'representation']
-        _keys_p = copy(list(current_content.get('body').get('storage').keys()))
-        _keys_p = list(filter(lambda x: x not in _keys_n, _keys_p))
-
-        for _k in _keys_p:
-            del(current_content['body']['storage'][_k])
-
-        current_content['body']['storage'] = {"value": new_content, "representation": "storage"}
+        current_content['body'] = {'storage': {"value": new_content, "representation": "storage"}}
         current_content['version'] = {'number': new_version}
 
         return current_content
@@ -300,10 +571,74 @@ class CiTypesSync:
         if _resp.status_code < 200  or _resp.status_code >= 300:
             _resp.raise_for_status()
 
-    def _save_report(self, report):
+    def _get_attachment(self, page_id, filename):
+        """
+        Return page attachment metadata
+        :param str page_id: Confluence page id
+        :param str filename: attachment file name
+        :return dict: attachment object from Confluence, None if absent
+        """
+        _rq_url = urljoin(self._args.wiki_url, posixpath.join("rest", "api", "content", page_id, "child", "attachment"))
+        logging.debug("RQ URL: '%s'" % _rq_url)
+        _rq_parms = {"filename": filename, "expand": "metadata"}
+        _headers = {"Content-type": "application/json"}
+        _resp = requests.get(_rq_url, params=_rq_parms, headers=_headers,
+                auth=(self._args.wiki_user, self._args.wiki_password))
+
+        if _resp.status_code < 200  or _resp.status_code >= 300:
+            _resp.raise_for_status()
+
+        _results = _resp.json().get("results")
+        return _results.pop(0) if _results else None
+
+    def _put_attachment(self, page_id, attachment_id, attachment):
+        """
+        Upload new attachment or new version of existing one
+        :param str page_id: Confluence page id
+        :param str attachment_id: Confluence attachment id, None for new attachment
+        :param dict attachment: attachment 'filename', 'data' and 'hash'
+        """
+        _rq_path = posixpath.join("rest", "api", "content", page_id, "child", "attachment")
+
+        if attachment_id:
+            _rq_path = posixpath.join(_rq_path, attachment_id, "data")
+
+        _rq_url = urljoin(self._args.wiki_url, _rq_path)
+        logging.debug("RQ URL: '%s'" % _rq_url)
+        _headers = {"X-Atlassian-Token": "no-check"}
+        _resp = requests.post(_rq_url, headers=_headers,
+                auth=(self._args.wiki_user, self._args.wiki_password),
+                files={"file": (attachment.get("filename"), attachment.get("data"), "application/gzip")},
+                data={"comment": "sha256:%s" % attachment.get("hash"), "minorEdit": "true"})
+        logging.info("Attachment '%s' post status code: '%d'" % (attachment.get("filename"), _resp.status_code))
+
+        if _resp.status_code < 200  or _resp.status_code >= 300:
+            _resp.raise_for_status()
+
+    def _save_attachment(self, page_id, attachment):
+        """
+        Upload attachment to Confluence page if its content has changed
+        :param str page_id: Confluence page id
+        :param dict attachment: attachment 'filename', 'data' and 'hash'
+        """
+        _current = self._get_attachment(page_id, attachment.get("filename"))
+        _attachment_id = None
+
+        if _current:
+            _attachment_id = _current.get("id")
+
+            # content hash is kept in attachment comment
+            if (_current.get("metadata") or dict()).get("comment") == "sha256:%s" % attachment.get("hash"):
+                logging.info("Attachment '%s' is not changed, skipping upload" % attachment.get("filename"))
+                return
+
+        self._put_attachment(page_id, _attachment_id, attachment)
+
+    def _save_report(self, report, attachment=None):
         """
         Put rendered report to Confluence
         :param str report: rendered XHTML report suitable for Confluence
+        :param dict attachment: attachment to upload to the page before the report, if any
         """
         if self._args.fn_out:
             _fn_out = os.path.abspath(self._args.fn_out)
@@ -311,13 +646,71 @@ class CiTypesSync:
             with open(_fn_out, mode="wt") as _fl_out:
                 _fl_out.write(report)
 
+            if attachment:
+                _fn_attachment = os.path.join(os.path.dirname(_fn_out), attachment.get("filename"))
+                logging.info("Writing attachment to: '%s'" % _fn_attachment)
+                with open(_fn_attachment, mode="wb") as _fl_out:
+                    _fl_out.write(attachment.get("data"))
+
             return
 
         _page_id = self._get_confluence_page_id()
-        _content = self._get_page_current_content(_page_id)
-        _version = self._get_page_new_version(_page_id)
-        _page_object = self._make_new_page_object(_content, _version, report)
+
+        if attachment:
+            # upload first for the page links not to be broken
+            self._save_attachment(_page_id, attachment)
+
+        _marker = self._make_report_marker(report)
+        _page = self._get_page_state(_page_id)
+        _current_marker = self._get_page_marker(_page) or dict()
+        # taken before the page object is reused for update
+        _property = self._get_page_property(_page)
+
+        if all([_current_marker.get("hash") == _marker.get("hash"),
+                _current_marker.get("schema") == _marker.get("schema")]):
+            logging.info("Page '%s' report is not changed, skipping update" % _page_id)
+            return
+
+        # the body is replaced entirely, no need to download it
+        _version = str(int(_page.get("version").get("number")) + 1)
+        logging.info("New version number: %s" % _version)
+        _page_object = self._make_new_page_object(_page, _version, report)
         self._put_to_confluence(_page_id, _page_object)
+        # saved after the page for the marker not to refer to a report which is not published
+        self._put_page_property(_page_id, _marker, _property)
+
+    def _serve(self, models):
+        """
+        Serve report as read-only HTTP JSON API until interrupted
+        :param django.Models models: database models
+        """
+        from django.db import connections
+
+        def _with_models(function):
+            def _call():
+                try:
+                    return function(models)
+                finally:
+                    # refreshing is done in a background thread, do not leave connections behind
+                    connections.close_all()
+
+            return _call
+
+        CatalogueServer(_with_models(self._get_citype_groups), _with_models(self._get_db_fingerprint),
+                ttl=self._args.serve_ttl, check_interval=self._args.serve_check_interval,
+                address=("", self._args.serve_port)).serve_forever()
+
+    def _call_phase(self, phase, function, *args):
+        """
+        Call run phase, under profiling if requested
+        :param str phase: phase name
+        :param function: callable implementing the phase
+        :return: whatever function returns
+        """
+        if not self._profiler:
+            return function(*args)
+
+        return self._profiler.call(phase, function, *args)
 
     def run(self, args):
         """
@@ -334,6 +727,7 @@ class CiTypesSync:
 
         logging.info("Logging level is set to %d" % self._args.log_level)
         logging.info("PSQL URL: '%s'" % self._args.psql_url)
+        logging.info("PSQL compare URLs: '%s'" % self._args.psql_compare_urls)
         logging.info("PSQL user: '%s'" % self._args.psql_user)
         logging.info("PSQL password: %s" % ('***' if self._args.psql_password else 'NOT SET'))
 
@@ -343,10 +737,45 @@ class CiTypesSync:
 
         logging.info("MVN prefix: '%s'" % self._args.mvn_prefix)
         logging.info("Page title: '%s'" % self._args.page_title)
+        logging.info("Page property: '%s'" % self._args.page_property)
         logging.info("Template: '%s'" % self._args.page_template)
+        logging.info("Regexp attachment: '%s'" % self._args.regexp_attachment)
+
+        if self._args.profile:
+            logging.info("Profiling to: '%s'" % self._args.profile)
+            self._profiler = PhaseProfiler(self._args.profile)
+
+        _models = self._call_phase("orm_init", self._do_orm_initialization)
+
+        if self._args.serve_port:
+            self._serve(_models)
+            return
+
+        self._db_fingerprint = self._get_db_fingerprint(_models)
+        logging.info("DB fingerprint: %s" % self._db_fingerprint)
+        _sources = self._get_sources()
+
+        if len(_sources) > 1:
+            _reports = self._get_source_reports(_models, _sources)
+            _json_group_report = _reports[self._args.psql_url]
+            _context = self._make_context(_json_group_report, self._compare_reports(_reports))
+        else:
+            _json_group_report = self._call_phase("get_citype_groups", self._get_citype_groups, _models)
+            _context = self._make_context(_json_group_report)
+
+        _digest = get_report_digest(_json_group_report)
+        logging.info("Report digest: %s" % _digest)
+
+        if self._args.digest:
+            print(_digest)
+            return
+
+        _rendered_template = self._call_phase("render_template", self._render_template, _context)
 
-        _models = self._do_orm_initialization()
-        _json_group_report = self._get_citype_groups(_models)
-        _rendered_template = self._render_template(self._make_context(_json_group_report))
-        self._save_report(_rendered_template)
+        if self._args.regexp_attachment:
+            # catalogue is made within the phase to be profiled along with uploading
+            self._call_phase("save_report", lambda: self._save_report(_rendered_template,
+                self._make_regexp_catalogue(_json_group_report)))
+        else:
+            self._call_phase("save_report", self._save_report, _rendered_template)
 
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+
+import cProfile
+import io
+import logging
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+
+class PhaseProfiler:
+    def __init__(self, out_dir, top=25, sample_interval=0.01):
+        """
+        Profiler for run phases: CPU with cProfile, memory with tracemalloc
+        :param str out_dir: directory to write profiling results to, created if absent
+        :param int top: number of functions and allocation sites to write to the summary
+        :param float sample_interval: traced memory sampling interval to catch allocation sites at peak, seconds
+        """
+        self._out_dir = os.path.abspath(out_dir)
+        self._top = top
+        self._sample_interval = sample_interval
+        self._phases = 0
+        # phases may run concurrently in worker threads while tracemalloc is process-wide
+        self._lock = threading.Lock()
+        self._tracing = 0
+        os.makedirs(self._out_dir, exist_ok=True)
+
+    def call(self, phase, function, *args, **kwargs):
+        """
+        Call a function under profiling and write results for it
+        May be called from several threads at once, one phase per thread.
+        Note: only the calling thread is profiled by cProfile while tracemalloc traces all threads,
+        so memory figures of concurrent phases include allocations of each other.
+        :param str phase: phase name, used for output file names
+        :param function: callable to profile
+        :return: whatever function returns
+        """
+        with self._lock:
+            self._phases += 1
+            _basename = os.path.join(self._out_dir, "%02d-%s" % (self._phases, phase))
+            self._tracing += 1
+
+            if self._tracing == 1:
+                tracemalloc.start()
+
+        _profile = cProfile.Profile()
+        _peak_sample = {"traced": 0, "snapshot": None}
+        _stop_sampling = threading.Event()
+        _sampler = threading.Thread(target=self._sample_peak, args=(_stop_sampling, _peak_sample), daemon=True)
+        _sampler.start()
+        _started = time.perf_counter()
+
+        try:
+            return _profile.runcall(function, *args, **kwargs)
+        finally:
+            _elapsed = time.perf_counter() - _started
+            _stop_sampling.set()
+            _sampler.join()
+
+            with self._lock:
+                _current, _peak = tracemalloc.get_traced_memory()
+                _snapshot = tracemalloc.take_snapshot()
+                self._tracing -= 1
+
+                if not self._tracing:
+                    tracemalloc.stop()
+
+            if _current >= _peak_sample["traced"]:
+                # phase is too short for sampling or memory is growing till its end
+                _peak_sample = {"traced": _current, "snapshot": _snapshot}
+
+            _profile.dump_stats(_basename + ".pstats")
+            self._write_summary(_basename + ".txt", phase, _elapsed, _peak, _profile, _peak_sample, _snapshot)
+            logging.info("Phase '%s': %.3f s, peak allocation: %d bytes, profile: '%s'" % (
+                phase, _elapsed, _peak, _basename + ".pstats"))
+
+    def _sample_peak(self, stop, peak_sample):
+        """
+        Take snapshots while traced memory grows, keep the largest one
+        :param threading.Event stop: sampling stops when set
+        :param dict peak_sample: largest sampled 'traced' memory and its 'snapshot', updated in place
+        """
+        while not stop.wait(self._sample_interval):
+            with self._lock:
+                _current = tracemalloc.get_traced_memory()[0]
+
+                # taking snapshot is not cheap, skip small growth
+                if _current > peak_sample["traced"] * 1.05:
+                    peak_sample["snapshot"] = tracemalloc.take_snapshot()
+                    peak_sample["traced"] = _current
+
+    def _write_statistics(self, stream, snapshot):
+        """
+        Write top allocation sites of snapshot, excluding profiling itself
+        :param io.StringIO stream: stream to write to
+        :param tracemalloc.Snapshot snapshot: snapshot to write
+        """
+        snapshot = snapshot.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)])
+
+        for _stat in snapshot.statistics("lineno")[:self._top]:
+            stream.write("%s\n" % _stat)
+
+    def _write_summary(self, path, phase, elapsed, peak, profile, peak_sample, snapshot):
+        """
+        Write human-readable phase summary
+        :param str path: path to summary file
+        :param str phase: phase name
+        :param float elapsed: wall time of the phase, seconds
+        :param int peak: peak traced memory, bytes
+        :param cProfile.Profile profile: CPU profile of the phase
+        :param dict peak_sample: largest sampled 'traced' memory and its 'snapshot'
+        :param tracemalloc.Snapshot snapshot: allocations retained at the end of the phase
+        """
+        _stream = io.StringIO()
+        _stream.write("Phase: %s\nWall time: %.3f s\nPeak allocation: %d bytes\n\n" % (phase, elapsed, peak))
+        _stream.write("Top %d allocation sites at the largest sampled allocation (%d bytes):\n" % (
+            self._top, peak_sample["traced"]))
+        self._write_statistics(_stream, peak_sample["snapshot"])
+        _stream.write("\nTop %d allocation sites retained at the end of the phase:\n" % self._top)
+        self._write_statistics(_stream, snapshot)
+        _stream.write("\nTop %d functions by cumulative time:\n" % self._top)
+        pstats.Stats(profile, stream=_stream).sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self._top)
+
+        with open(path, mode="wt") as _fl_out:
+            _fl_out.write(_stream.getvalue())
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+
+# Native emitter for groups/types table rows of the page template.
+# Output must be byte-for-byte the same as the one of Jinja loops in 'ci-type-groups-and-ci-types.xhtml.template',
+# so all the whitespace below is copied from there. Change both simultaneously.
+
+_GROUP_HEAD = '\n      <tr>\n       <td rowspan="%s">%s</td>\n       <td rowspan="%s">%s</td>\n       '
+_TYPE_HEAD = '\n        '
+_TYPE_ROW_OPEN = '\n         <tr>\n        '
+_TYPE_CELLS = ('\n        <td rowspan="%s">%s</td>\n        <td rowspan="%s">%s</td>'
+        '\n        <td rowspan="%s">%s</td>\n        <td rowspan="%s">%s</td>\n        <td>\n         ')
+_REGEXP_LIST_OPEN = '\n          <ul>\n          '
+_REGEXP_ITEM = '\n           <li>%s</li>\n          '
+_REGEXP_LIST_CLOSE = '\n          </ul>\n         '
+_REGEXP_ATTACHMENT = '\n          %d (<ac:link><ri:attachment ri:filename="%s"/></ac:link>)\n         '
+_TYPE_TAIL = '\n        </td>\n        </tr>\n     '
+_EMPTY_GROUP = ('\n      <td></td>\n      <td></td>\n      <td></td>\n      <td></td>\n      <td></td>'
+        '\n      </tr>\n     ')
+_GROUP_TAIL = '\n    '
+
+def _value(item, key):
+    """
+    Return item value as Jinja2 renders it: absent values are empty
+    :param dict item: group or type dictionary
+    :param str key: value key
+    :return str: value to output
+    """
+    if key not in item:
+        return ""
+
+    return str(item[key])
+
+def render_groups_table(groups, regexp_attachment=None):
+    """
+    Render table rows for groups and types
+    :param list groups: ci-type-groups report
+    :param str regexp_attachment: attachment name to refer instead of listing regexps
+    :return str: rendered table rows
+    """
+    _parts = list()
+    _append = _parts.append
+
+    for _group in groups:
+        _rowspan = _value(_group, "rowspan")
+        _append(_GROUP_HEAD % (_rowspan, _value(_group, "code"), _rowspan, _value(_group, "name")))
+        _types = _group.get("types")
+
+        if not _types:
+            _append(_EMPTY_GROUP)
+            _append(_GROUP_TAIL)
+            continue
+
+        _first = True
+
+        for _type in _types:
+            _append(_TYPE_HEAD)
+
+            if _first:
+                _first = False
+            else:
+                _append(_TYPE_ROW_OPEN)
+
+            _rowspan = _value(_type, "rowspan")
+            _append(_TYPE_CELLS % (
+                _rowspan, _value(_type, "code"), _rowspan, _value(_type, "name"),
+                _rowspan, _value(_type, "standard"), _rowspan, _value(_type, "deliverable")))
+            _regexps = _type.get("regexp")
+
+            if regexp_attachment:
+                _append(_REGEXP_ATTACHMENT % (len(_regexps), regexp_attachment))
+            elif _regexps:
+                _append(_REGEXP_LIST_OPEN)
+
+                for _regexp in _regexps:
+                    _append(_REGEXP_ITEM % (_regexp,))
+
+                _append(_REGEXP_LIST_CLOSE)
+
+            _append(_TYPE_TAIL)
+
+        _append(_GROUP_TAIL)
+
+    return "".join(_parts)
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+
+# Local Confluence REST API stub for tests: pages search, content GET and PUT, content properties,
+# page attachments. Latency, bandwidth and error rate of a slow server may be injected.
+
+import email.parser
+import email.policy
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+class ConfluenceStub:
+    def __init__(self, latency=0.0, bandwidth=None, error_rate=0.0, seed=None):
+        """
+        Stub initialization, call 'start' to serve
+        :param float latency: delay before each response, seconds
+        :param int bandwidth: request and response bodies transfer speed, bytes per second, unlimited if not set
+        :param float error_rate: probability of a request to fail with 503 status code
+        :param seed: random seed for errors injection
+        """
+        self.pages = dict()
+        self.attachments = dict()
+        self.requests = list()
+        self.connections = 0
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+        self._last_id = 1000
+
+    def _next_id(self):
+        self._last_id += 1
+        return str(self._last_id)
+
+    def add_page(self, title, body=""):
+        """
+        Add page to the stub
+        :param str title: page title
+        :param str body: page body in storage format
+        :return str: page id
+        """
+        _page_id = self._next_id()
+        self.pages[_page_id] = {"id": _page_id, "type": "page", "title": title, "status": "current",
+                "body": {"storage": {"value": body, "representation": "storage"}},
+                "version": {"number": 1}, "properties": dict()}
+        self.attachments[_page_id] = dict()
+        return _page_id
+
+    @property
+    def url(self):
+        return "http://%s:%d/" % self._server.server_address
+
+    def start(self):
+        """
+        Start serving on a free localhost port in a background thread
+        """
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stop serving
+        """
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def stats(self):
+        """
+        Return summary of requests served
+        :return dict: numbers of requests and connections, bytes received and sent
+        """
+        with self._lock:
+            return {"requests": len(self.requests), "connections": self.connections,
+                    "errors": len(list(filter(lambda x: x["status_code"] >= 500, self.requests))),
+                    "received": sum(_r["received"] for _r in self.requests),
+                    "sent": sum(_r["sent"] for _r in self.requests)}
+
+    def _transfer(self, size):
+        """
+        Simulate transfer of bytes with bandwidth limited
+        :param int size: number of bytes
+        """
+        if self.bandwidth:
+            time.sleep(size / self.bandwidth)
+
+    def _make_handler(self):
+        _stub = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+
+                with _stub._lock:
+                    _stub.connections += 1
+
+            def log_message(self, *args):
+                pass
+
+            def _handle(self, method):
+                _url = urlparse(self.path)
+                _params = dict((_k, _v[0]) for _k, _v in parse_qs(_url.query).items())
+                _body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                _stub._transfer(len(_body))
+
+                with _stub._lock:
+                    if _stub.error_rate and _stub._random.random() < _stub.error_rate:
+                        _status_code, _obj = 503, {"message": "Service unavailable (injected)"}
+                    else:
+                        _status_code, _obj = _stub._route(method, _url.path, _params, self.headers, _body)
+
+                    _data = json.dumps(_obj).encode("utf-8")
+                    _stub.requests.append({"method": method, "path": _url.path, "params": _params,
+                        "status_code": _status_code, "received": len(_body), "sent": len(_data)})
+
+                # delays are outside of the lock for concurrent requests not to wait for each other
+                time.sleep(_stub.latency)
+                _stub._transfer(len(_data))
+                self.send_response(_status_code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(_data)))
+                self.end_headers()
+                self.wfile.write(_data)
+
+            def do_GET(self):
+                self._handle("GET")
+
+            def do_PUT(self):
+                self._handle("PUT")
+
+            def do_POST(self):
+                self._handle("POST")
+
+        return _Handler
+
+    def _route(self, method, path, params, headers, body):
+        """
+        Process request
+        :return tuple: status code and object to reply with
+        """
+        _match = re.match(r"^/rest/api/content(?:/(?P<page_id>\d+))?(?P<child>/child/attachment)?"
+                r"(?:/(?P<attachment_id>\d+)/data)?(?P<property>/property(?:/(?P<key>[^/]+))?)?/?$", path)
+
+        if not _match:
+            return 404, {"message": "Not found: %s" % path}
+
+        _page_id = _match.group("page_id")
+
+        if not _page_id:
+            if method != "GET":
+                return 405, {"message": "Method not allowed"}
+
+            return 200, {"results": [{"id": _p["id"], "type": _p["type"], "title": _p["title"]}
+                for _p in self.pages.values() if _p["title"] == params.get("title")]}
+
+        if _page_id not in self.pages:
+            return 404, {"message": "No content with id: %s" % _page_id}
+
+        if _match.group("property"):
+            return self._route_property(method, _page_id, _match.group("key"), body)
+
+        if _match.group("child"):
+            return self._route_attachment(method, _page_id, _match.group("attachment_id"), params, headers, body)
+
+        if method == "GET":
+            return 200, self._get_page(_page_id, params.get("expand", "").split(","))
+
+        if method == "PUT":
+            return self._put_page(_page_id, json.loads(body))
+
+        return 405, {"message": "Method not allowed"}
+
+    def _get_page(self, page_id, expand):
+        _page = self.pages[page_id]
+        _result = dict((_k, _v) for _k, _v in _page.items() if _k not in ["body", "properties"])
+
+        if "body.storage" in expand:
+            _result["body"] = {"storage": dict(_page["body"]["storage"])}
+
+        for _expand in expand:
+            if not _expand.startswith("metadata.properties."):
+                continue
+
+            _key = _expand.split(".", 2)[2]
+            _properties = _result.setdefault("metadata", dict()).setdefault("properties", dict())
+
+            if _key in _page["properties"]:
+                _properties[_key] = dict(_page["properties"][_key])
+
+        return _result
+
+    def _put_page(self, page_id, obj):
+        _page = self.pages[page_id]
+
+        if int(obj["version"]["number"]) != _page["version"]["number"] + 1:
+            return 409, {"message": "Version must be incremented on update"}
+
+        _page["body"] = {"storage": {"value": obj["body"]["storage"]["value"], "representation": "storage"}}
+        _page["version"] = {"number": _page["version"]["number"] + 1}
+        # as Confluence does, 'metadata' of the page object is not saved on update
+
+        return 200, self._get_page(page_id, ["body.storage"])
+
+    def _route_property(self, method, page_id, key, body):
+        _properties = self.pages[page_id]["properties"]
+
+        if method == "GET" and key:
+            if key not in _properties:
+                return 404, {"message": "No property with key: %s" % key}
+
+            return 200, dict(_properties[key])
+
+        if method == "POST" and not key:
+            _obj = json.loads(body)
+
+            if _obj["key"] in _properties:
+                return 409, {"message": "Property already exists: %s" % _obj["key"]}
+
+            _properties[_obj["key"]] = {"key": _obj["key"], "value": _obj["value"], "version": {"number": 1}}
+            return 200, dict(_properties[_obj["key"]])
+
+        if method == "PUT" and key:
+            _obj = json.loads(body)
+
+            if key not in _properties:
+                return 404, {"message": "No property with key: %s" % key}
+
+            if int((_obj.get("version") or dict()).get("number", 0)) != _properties[key]["version"]["number"] + 1:
+                return 409, {"message": "Version must be incremented on update"}
+
+            _properties[key] = {"key": key, "value": _obj["value"], "version": {"number": _properties[key]["version"]["number"] + 1}}
+            return 200, dict(_properties[key])
+
+        return 405, {"message": "Method not allowed"}
+
+    def _route_attachment(self, method, page_id, attachment_id, params, headers, body):
+        _attachments = self.attachments[page_id]
+
+        if method == "GET" and not attachment_id:
+            return 200, {"results": [self._attachment_object(_a) for _a in _attachments.values()
+                if not params.get("filename") or _a["title"] == params.get("filename")]}
+
+        if method != "POST":
+            return 405, {"message": "Method not allowed"}
+
+        if headers.get("X-Atlassian-Token") != "no-check":
+            return 403, {"message": "XSRF check failed"}
+
+        _fields = self._parse_multipart(headers.get("Content-Type"), body)
+        _filename, _data = _fields.get("file")
+        _comment = _fields.get("comment", (None, b""))[1].decode("utf-8")
+
+        if attachment_id:
+            _attachment = next(filter(lambda x: x["id"] == attachment_id, _attachments.values()), None)
+
+            if not _attachment:
+                return 404, {"message": "No attachment with id: %s" % attachment_id}
+
+            _attachment.update({"data": _data, "comment": _comment, "version": _attachment["version"] + 1})
+        else:
+            if _filename in _attachments:
+                return 400, {"message": "Cannot add a new attachment with same file name as an existing attachment"}
+
+            _attachment = {"id": self._next_id(), "title": _filename, "data": _data, "comment": _comment, "version": 1}
+            _attachments[_filename] = _attachment
+
+        return 200, {"results": [self._attachment_object(_attachment)]}
+
+    def _attachment_object(self, attachment):
+        return {"id": attachment["id"], "type": "attachment", "title": attachment["title"],
+                "metadata": {"comment": attachment["comment"]},
+                "version": {"number": attachment["version"]},
+                "extensions": {"fileSize": len(attachment["data"])}}
+
+    def _parse_multipart(self, content_type, body):
+        """
+        Parse multipart/form-data body
+        :return dict: field name to tuple of (file name, value bytes)
+        """
+        _message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+                b"Content-Type: " + content_type.encode("utf-8") + b"\r\n\r\n" + body)
+        _result = dict()
+
+        for _part in _message.iter_parts():
+            _result[_part.get_param("name", header="content-disposition")] = (
+                    _part.get_filename(), _part.get_payload(decode=True))
+
+        return _result
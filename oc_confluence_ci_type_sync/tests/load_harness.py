@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+
+# End-to-end load harness: CiTypesSync.run against local Confluence stub and SQLite database,
+# reports wall time of each run phase along with the traffic.
+# Usage: python -m oc_confluence_ci_type_sync.tests.load_harness --help
+
+import argparse
+import os
+import tempfile
+import time
+from oc_confluence_ci_type_sync.ci_types_sync import CiTypesSync, _ModelsOnDatabase
+from oc_confluence_ci_type_sync.tests import sqlite_fixture
+from oc_confluence_ci_type_sync.tests.confluence_stub import ConfluenceStub
+
+_databases = 0
+
+class _HarnessCiTypesSync(CiTypesSync):
+    def __init__(self, models):
+        """
+        Synchronizer working with models given instead of PostgreSQL, with phases timed
+        :param django.Models models: database models
+        """
+        super().__init__()
+        self._models = models
+        self.timings = dict()
+
+    def _do_orm_initialization(self):
+        return self._models
+
+    def _call_phase(self, phase, function, *args):
+        _started = time.perf_counter()
+
+        try:
+            return super()._call_phase(phase, function, *args)
+        finally:
+            self.timings[phase] = time.perf_counter() - _started
+
+def make_groups(types, regexps, group_size=10):
+    """
+    Generate data for SQLite database
+    :param int types: number of types
+    :param int regexps: number of regexps per type
+    :param int group_size: number of types per group, the last group may be non-groupped types
+    :return list: groups for sqlite_fixture.add_database
+    """
+    _result = list()
+
+    for _start in range(0, types, group_size):
+        _index = len(_result)
+        _result.append({"code": "GROUP%d" % _index, "name": "Group %d" % _index, "types": [
+            {"code": "TYPE%d" % _it, "name": "Type %d" % _it, "is_standard": "Y" if _it % 2 else "N",
+                "is_deliverable": bool(_it % 3),
+                "regexp": ["com\\.example\\.group%d:type%d-%d:.*:zip" % (_index, _it, _ir) for _ir in range(0, regexps)]}
+            for _it in range(_start, min(_start + group_size, types))]})
+
+    if _result:
+        # the last group is for non-groupped types
+        _result[-1]["code"] = ""
+
+    return _result
+
+def run_harness(types=1000, regexps=3, runs=2, latency=0.0, bandwidth=None, error_rate=0.0, seed=None,
+        extra_args=None):
+    """
+    Run synchronization several times against the same page
+    :param int types: number of types in the database
+    :param int regexps: number of regexps per type
+    :param int runs: number of runs; all but the first one have no changes to publish
+    :param float latency: Confluence stub latency, seconds
+    :param int bandwidth: Confluence stub bandwidth, bytes per second
+    :param float error_rate: Confluence stub error rate
+    :param seed: random seed for errors injection
+    :param list extra_args: additional command-line arguments for the synchronizer
+    :return list: results of runs: phases timings, total time, stub statistics and error if any
+    """
+    global _databases
+    _databases += 1
+    _alias = "harness_%d" % _databases
+    _results = list()
+
+    with tempfile.TemporaryDirectory() as _tmpdir:
+        _models = _ModelsOnDatabase(sqlite_fixture.add_database(
+            _alias, os.path.join(_tmpdir, "checksums.sqlite3"), make_groups(types, regexps)), _alias)
+
+        with ConfluenceStub(latency=latency, bandwidth=bandwidth, error_rate=error_rate, seed=seed) as _stub:
+            _stub.add_page("CI_TYPE_GROUPS and CI_TYPES", "<p>initial</p>")
+
+            for _run in range(0, runs):
+                _args = CiTypesSync().basic_args().parse_args([
+                    "--psql-url", _alias, "--wiki-url", _stub.url, "--wiki-user", "harness",
+                    "--wiki-password", "harness", "--mvn-prefix", "com.example", "--log-level", "30"] +
+                    (extra_args or list()))
+                _args.psql_compare_urls = None
+                _sync = _HarnessCiTypesSync(_models)
+                _stats_before = _stub.stats()
+                _error = None
+                _started = time.perf_counter()
+
+                try:
+                    _sync.run(_args)
+                except Exception as _e:
+                    _error = str(_e)
+
+                _total = time.perf_counter() - _started
+                _stats = _stub.stats()
+                _results.append(dict([("run", _run), ("phases", _sync.timings), ("total", _total), ("error", _error)] +
+                    [(_k, _v - _stats_before[_k]) for _k, _v in _stats.items()]))
+
+    return _results
+
+def format_results(results):
+    """
+    Format harness results as a text table
+    :param list results: run_harness results
+    :return str: table
+    """
+    _phases = list()
+
+    for _result in results:
+        _phases += list(filter(lambda x: x not in _phases, _result.get("phases").keys()))
+
+    _columns = ["run"] + _phases + ["total", "requests", "connections", "errors", "received", "sent"]
+    _lines = [" ".join("%18s" % _c for _c in _columns)]
+
+    for _result in results:
+        _values = [str(_result.get("run"))]
+        _values += ["%.3f" % _result.get("phases").get(_p) if _p in _result.get("phases") else "-" for _p in _phases]
+        _values += ["%.3f" % _result.get("total")]
+        _values += [str(_result.get(_k)) for _k in ["requests", "connections", "errors", "received", "sent"]]
+        _lines.append(" ".join("%18s" % _v for _v in _values))
+
+        if _result.get("error"):
+            _lines.append("    error: %s" % _result.get("error"))
+
+    return "\n".join(_lines)
+
+if __name__ == "__main__":
+    _parser = argparse.ArgumentParser(description="CI_TYPES synchronization end-to-end load harness")
+    _parser.add_argument("--types", type=int, default=1000, help="Number of types in the database")
+    _parser.add_argument("--regexps", type=int, default=3, help="Number of regexps per type")
+    _parser.add_argument("--runs", type=int, default=2, help="Number of runs, all but the first have no changes")
+    _parser.add_argument("--latency", type=float, default=0.0, help="Confluence latency, seconds")
+    _parser.add_argument("--bandwidth", type=int, help="Confluence bandwidth, bytes per second")
+    _parser.add_argument("--error-rate", dest="error_rate", type=float, default=0.0, help="Confluence error rate")
+    _parser.add_argument("--seed", type=int, help="Random seed for errors injection")
+    _args, _extra_args = _parser.parse_known_args()
+    print(format_results(run_harness(types=_args.types, regexps=_args.regexps, runs=_args.runs,
+        latency=_args.latency, bandwidth=_args.bandwidth, error_rate=_args.error_rate, seed=_args.seed,
+        extra_args=_extra_args)))
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+
+# SQLite databases with checksums models for tests working with real Django ORM
+# Django may be configured once per process only, so all the databases are added as aliases
+
+import django
+from django.conf import settings
+
+_installed_apps = ["django.contrib.contenttypes", "django.contrib.auth", "oc_delivery_apps.checksums"]
+
+def setup_django():
+    """
+    Configure Django with in-memory default database, if not done yet
+    :return django.Models: checksums models
+    """
+    if not settings.configured:
+        settings.configure(
+                DATABASES={"default": {"ENGINE": "django.db.backends.sqlite3", "NAME": ":memory:"}},
+                INSTALLED_APPS=_installed_apps,
+                USE_TZ=True,
+                TIME_ZONE="Etc/UTC")
+        django.setup()
+
+    from oc_delivery_apps.checksums import models
+    return models
+
+def add_database(alias, path, groups):
+    """
+    Register SQLite database file as Django alias and fill it with the data given
+    :param str alias: django database alias
+    :param str path: path to SQLite database file, should not exist
+    :param list groups: groups in report-like format, group with empty code is for non-groupped types;
+        each type is a dict with 'code', 'name', 'is_standard', 'is_deliverable' and 'regexp' keys
+    :return django.Models: checksums models
+    """
+    models = setup_django()
+    from django.db import connections
+    connections.databases[alias] = {"ENGINE": "django.db.backends.sqlite3", "NAME": path}
+
+    with connections[alias].schema_editor() as _editor:
+        for _model in [models.CiTypes, models.CiTypeGroups, models.CiTypeIncs, models.LocTypes, models.CiRegExp]:
+            _editor.create_model(_model)
+
+    _loc_type = models.LocTypes.objects.using(alias).create(code="NXS", name="Nexus")
+
+    for _group in groups:
+        _citype_group = None
+
+        if _group.get("code"):
+            _citype_group = models.CiTypeGroups.objects.using(alias).create(
+                    code=_group.get("code"), name=_group.get("name"))
+
+        for _type in _group.get("types"):
+            _citype = models.CiTypes.objects.using(alias).create(
+                    code=_type.get("code"), name=_type.get("name"),
+                    is_standard=_type.get("is_standard", "N"), is_deliverable=_type.get("is_deliverable", False))
+
+            if _citype_group:
+                models.CiTypeIncs.objects.using(alias).create(ci_type_group=_citype_group, ci_type=_citype)
+
+            for _regexp in _type.get("regexp", list()):
+                models.CiRegExp.objects.using(alias).create(loc_type=_loc_type, ci_type=_citype, regexp=_regexp)
+
+    # the connection belongs to the current thread, release it
+    connections[alias].close()
+    return models
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+
+import unittest
+import random
+from oc_confluence_ci_type_sync.canonical_report import make_canonical_report, get_report_digest
+
+class CanonicalReportTest(unittest.TestCase):
+    @property
+    def __report(self):
+        return [
+                {"code": "", "name": "", "types": [
+                    {"code": "TYPE3", "name": "Type  3 ", "regexp": []},
+                    {"code": "TYPE2", "name": "Type 2", "regexp": ["reg_2"]}], "rowspan": 2},
+                {"code": "GROUP1", "name": " Group\t1", "types": [
+                    {"code": "TYPE1 ", "name": "Type 1", "regexp": ["reg_b", " reg_a", "", "  ", "reg_b", "reg a"]}],
+                    "rowspan": 1},
+                {"code": "GROUP0", "name": "Group 0", "types": [], "rowspan": 1}]
+
+    def test_make_canonical_report(self):
+        # codes and regexps are not changed, only blank regexps are removed
+        self.assertEqual([
+            {"code": "GROUP0", "name": "Group 0", "types": [], "rowspan": 1},
+            {"code": "GROUP1", "name": "Group 1", "types": [
+                {"code": "TYPE1 ", "name": "Type 1", "regexp": [" reg_a", "reg a", "reg_b", "reg_b"]}],
+                "rowspan": 1},
+            {"code": "", "name": "", "types": [
+                {"code": "TYPE2", "name": "Type 2", "regexp": ["reg_2"]},
+                {"code": "TYPE3", "name": "Type 3", "regexp": []}], "rowspan": 2}],
+            make_canonical_report(self.__report))
+
+    def test_get_report_digest(self):
+        _digest = get_report_digest(make_canonical_report(self.__report))
+        self.assertEqual(64, len(_digest))
+
+        # rows order does not matter
+        _random = random.Random(1)
+
+        for _i in range(0, 10):
+            _report = self.__report
+            _random.shuffle(_report)
+
+            for _group in _report:
+                _random.shuffle(_group["types"])
+
+                for _type in _group["types"]:
+                    _random.shuffle(_type["regexp"])
+
+            self.assertEqual(_digest, get_report_digest(make_canonical_report(_report)))
+
+        # data does
+        _report = self.__report
+        _report[0]["types"][0]["regexp"].append("reg_3")
+        self.assertNotEqual(_digest, get_report_digest(make_canonical_report(_report)))
+
+        # whitespace in codes and regexps does too
+        _report = self.__report
+        _report[1]["types"][0]["code"] = "TYPE1"
+        self.assertNotEqual(_digest, get_report_digest(make_canonical_report(_report)))
+
+        _report = self.__report
+        _report[1]["types"][0]["regexp"].remove(" reg_a")
+        _report[1]["types"][0]["regexp"].append("reg_a")
+        self.assertNotEqual(_digest, get_report_digest(make_canonical_report(_report)))
+
+        # while whitespace in display names does not
+        _report = self.__report
+        _report[1]["name"] = "Group 1"
+        self.assertEqual(_digest, get_report_digest(make_canonical_report(_report)))
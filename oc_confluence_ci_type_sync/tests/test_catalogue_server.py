@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+
+import unittest
+import unittest.mock
+import json
+from oc_confluence_ci_type_sync.ci_types_sync import CiTypesSync, _ModelsOnDatabase
+from oc_confluence_ci_type_sync.catalogue_server import Catalogue, CatalogueServer
+from oc_confluence_ci_type_sync.tests import sqlite_fixture
+import os
+import tempfile
+import time
+import requests
+
+# remove unnecessary log output
+import logging
+logging.getLogger().propagate = False
+logging.getLogger().disabled = True
+
+_groups = [
+        {"code": "GROUP0", "name": "Group 0", "types": [
+            {"code": "TYPE0", "name": "Type 0", "is_standard": "Y", "regexp": ["reg_0", "reg_common"]},
+            {"code": "TYPE1", "name": "Type 1", "is_deliverable": True, "regexp": ["reg_common"]}]},
+        {"code": "GROUP1", "name": "Group 1", "types": []},
+        {"code": "", "name": "", "types": [
+            {"code": "TYPE2", "name": "Type 2", "regexp": []}]}]
+
+class CatalogueServerTest(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self._alias = "catalogue_%s" % self.id().split(".")[-1]
+        self._models = _ModelsOnDatabase(sqlite_fixture.add_database(
+            self._alias, os.path.join(self._tmpdir.name, "checksums.sqlite3"), _groups), self._alias)
+        self._ts = CiTypesSync()
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def __server(self, **kwargs):
+        return CatalogueServer(lambda: self._ts._get_citype_groups(self._models),
+                lambda: self._ts._get_db_fingerprint(self._models), address=("127.0.0.1", 0), **kwargs)
+
+    def test_catalogue(self):
+        _catalogue = Catalogue(self._ts._get_citype_groups(self._models), "the_fingerprint")
+        self.assertEqual("the_fingerprint", _catalogue.fingerprint)
+        self.assertEqual({"code": "TYPE0", "name": "Type 0", "standard": "Yes", "deliverable": "No",
+            "regexp": ["reg_0", "reg_common"], "groups": ["GROUP0"]}, _catalogue.types["TYPE0"])
+        self.assertEqual([], _catalogue.types["TYPE2"]["groups"])
+        self.assertEqual({"code": "GROUP1", "name": "Group 1", "types": []}, _catalogue.groups["GROUP1"])
+        self.assertNotIn("", _catalogue.groups)
+        self.assertEqual(["TYPE0", "TYPE1"], _catalogue.regexps["reg_common"])
+        self.assertEqual(_catalogue.etag, Catalogue(self._ts._get_citype_groups(self._models)).etag)
+        self.assertEqual(_catalogue.report, json.loads(_catalogue.data))
+
+        # lookups do not touch DB
+        _server = self.__server()
+        _server.refresh(force=True)
+        _started = time.perf_counter()
+
+        for _i in range(0, 10000):
+            self.assertEqual(200, _server.lookup("/types/TYPE1", {})[0])
+
+        self.assertLess((time.perf_counter() - _started) / 10000, 0.001)
+
+    def test_serve(self):
+        with self.__server() as _server:
+            _resp = requests.get(_server.url + "types/TYPE1")
+            self.assertEqual(200, _resp.status_code)
+            self.assertEqual(["GROUP0"], _resp.json().get("groups"))
+            _etag = _resp.headers.get("ETag")
+            self.assertEqual(_server.catalogue.etag, _etag)
+
+            _resp = requests.get(_server.url + "types/TYPE1", headers={"If-None-Match": _etag})
+            self.assertEqual(304, _resp.status_code)
+            self.assertEqual(b"", _resp.content)
+
+            self.assertEqual(["TYPE0", "TYPE1", "TYPE2"], requests.get(_server.url + "types").json())
+            self.assertEqual(["GROUP0", "GROUP1"], requests.get(_server.url + "groups").json())
+            self.assertEqual(["TYPE0", "TYPE1"], requests.get(_server.url + "groups/GROUP0").json().get("types"))
+            self.assertEqual({"regexp": "reg_0", "types": ["TYPE0"]},
+                    requests.get(_server.url + "regexps", params={"regexp": "reg_0"}).json())
+            _resp = requests.get(_server.url + "catalogue")
+            self.assertEqual(3, len(_resp.json()))
+            self.assertEqual(_server.catalogue.data, _resp.content)
+
+            with unittest.mock.patch("json.dumps") as _dumps:
+                # served from serialized data, not serialized on request
+                self.assertEqual(200, requests.get(_server.url + "catalogue").status_code)
+                _dumps.assert_not_called()
+
+
+            for _path in ["types/TYPE9", "groups/GROUP9", "regexps?regexp=reg_9", "unknown"]:
+                _resp = requests.get(_server.url + _path)
+                self.assertEqual(404, _resp.status_code)
+                self.assertIsNone(_resp.headers.get("ETag"))
+
+    def test_refresh(self):
+        _server = self.__server(ttl=600)
+        self.assertTrue(_server.refresh(force=True))
+        _catalogue = _server.catalogue
+
+        # nothing changed
+        self.assertFalse(_server.refresh())
+        self.assertIs(_catalogue, _server.catalogue)
+
+        # DB fingerprint changed
+        self._models.CiTypes.objects.create(code="TYPE3", name="Type 3")
+        self.assertTrue(_server.refresh())
+        self.assertIn("TYPE3", _server.catalogue.types)
+        self.assertNotEqual(_catalogue.etag, _server.catalogue.etag)
+
+        # expired
+        _server._ttl = 0
+        self.assertTrue(_server.refresh())
+
+    def test_background_refresh(self):
+        with self.__server(check_interval=0.05) as _server:
+            _etag = requests.get(_server.url + "types").headers.get("ETag")
+            self._models.CiTypes.objects.create(code="TYPE3", name="Type 3")
+
+            for _i in range(0, 100):
+                if "TYPE3" in _server.catalogue.types:
+                    break
+
+                time.sleep(0.05)
+
+            _resp = requests.get(_server.url + "types", headers={"If-None-Match": _etag})
+            self.assertEqual(200, _resp.status_code)
+            self.assertIn("TYPE3", _resp.json())
+
+    def test_refresh_failure(self):
+        # previous catalogue is served if reloading fails
+        _fingerprinter = unittest.mock.MagicMock(side_effect=["first", Exception("DB is gone")])
+
+        with CatalogueServer(lambda: _groups, _fingerprinter, check_interval=0.05,
+                address=("127.0.0.1", 0)) as _server:
+            time.sleep(0.2)
+            self.assertEqual("first", _server.catalogue.fingerprint)
+            self.assertEqual(200, requests.get(_server.url + "groups/GROUP0").status_code)
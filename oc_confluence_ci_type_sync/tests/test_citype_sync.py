@@ -2,11 +2,16 @@
 
 import unittest
 import unittest.mock
-from oc_confluence_ci_type_sync.ci_types_sync import CiTypesSync
+from oc_confluence_ci_type_sync.ci_types_sync import CiTypesSync, REPORT_SCHEMA_VERSION, _ModelsOnDatabase
+from oc_confluence_ci_type_sync.canonical_report import get_report_digest
+from oc_confluence_ci_type_sync.tests import sqlite_fixture
 import argparse
 import os
 import json
 import tempfile
+import gzip
+import hashlib
+from oc_confluence_ci_type_sync.tests.confluence_stub import ConfluenceStub
 
 # remove unnecessary log output
 import logging
@@ -40,6 +45,7 @@ class OcConfluenceCiTypeSyncTest(unittest.TestCase):
         _t = CiTypesSync()
         self.assertIsNone(_t._args)
         self.assertFalse(_t._orm_initialization_done)
+        self.assertIsNone(_t._profiler)
 
     @property
     def __args(self):
@@ -265,7 +271,118 @@ class OcConfluenceCiTypeSyncTest(unittest.TestCase):
         _ts = CiTypesSync()
         _ts._args = unittest.mock.MagicMock()
         _ts._args.mvn_prefix = "prefix"
+        _ts._args.regexp_attachment = None
         self.assertEqual({"mvn_prefix": "prefix", "groups": "group_report_stub"}, _ts._make_context(_report))
+        self.assertEqual({"mvn_prefix": "prefix", "groups": "group_report_stub", "consistency": []},
+                _ts._make_context(_report, []))
+        _ts._args.regexp_attachment = "regexps.json.gz"
+        self.assertEqual({"mvn_prefix": "prefix", "groups": "group_report_stub", "regexp_attachment": "regexps.json.gz"},
+                _ts._make_context(_report))
+
+    def test_make_regexp_catalogue(self):
+        _ts = CiTypesSync()
+        _ts._args = unittest.mock.MagicMock()
+        _ts._args.regexp_attachment = "regexps.json.gz"
+        _report = [
+                {"code": "GROUP0", "types": [{"code": "TYPE1", "regexp": ["reg_1", "reg_0"]}]},
+                {"code": "", "types": [{"code": "TYPE0", "regexp": []}]}]
+        _attachment = _ts._make_regexp_catalogue(_report)
+        self.assertEqual("regexps.json.gz", _attachment.get("filename"))
+        self.assertEqual({"TYPE0": [], "TYPE1": ["reg_1", "reg_0"]}, json.loads(gzip.decompress(_attachment.get("data"))))
+        self.assertEqual(hashlib.sha256(gzip.decompress(_attachment.get("data"))).hexdigest(), _attachment.get("hash"))
+        # stable for the same content
+        self.assertEqual(_attachment, _ts._make_regexp_catalogue(_report))
+
+    def test_parse_psql_url(self):
+        _ts = CiTypesSync()
+        self.assertEqual({"HOST": "psql.example.com", "PORT": 5433, "NAME": "db",
+            "OPTIONS": {"options": "-c search_path=cnt_schema"}},
+            _ts._parse_psql_url("psql.example.com:5433/db?search_path=cnt_schema"))
+        self.assertEqual(5432, _ts._parse_psql_url("postgres://psql.example.com/db?search_path=dl_schema")["PORT"])
+
+        for _url in ["psql.example.com:5432?search_path=dl_schema", "psql.example.com:5432/db"]:
+            with self.assertRaises(ValueError):
+                _ts._parse_psql_url(_url)
+
+    def test_get_sources(self):
+        sqlite_fixture.setup_django()
+        from django.db import connections
+        _ts = CiTypesSync()
+        _ts._args = self.__args
+        _ts._args.psql_url = "psql.example.com:5432/db?search_path=dl_schema"
+        _ts._args.psql_compare_urls = None
+        self.assertEqual({_ts._args.psql_url: "default"}, _ts._get_sources())
+
+        _ts._args.psql_compare_urls = [_ts._args.psql_url, "psql.example.com:5433/db?search_path=cnt_schema"]
+        self.assertEqual({_ts._args.psql_url: "default", _ts._args.psql_compare_urls[1]: "compare_1"},
+                _ts._get_sources())
+        self.addCleanup(connections.databases.pop, "compare_1")
+        _db = connections.databases["compare_1"]
+        self.assertEqual(("psql.example.com", 5433, "db", "-c search_path=cnt_schema"),
+                (_db["HOST"], _db["PORT"], _db["NAME"], _db["OPTIONS"]["options"]))
+        # the rest is taken from the main database
+        self.assertEqual(connections.databases["default"]["ENGINE"], _db["ENGINE"])
+
+    def __compare_data(self):
+        # the same types with a difference in groups and regexps
+        _reference = [
+                {"code": "GROUP0", "name": "Group 0", "types": [
+                    {"code": "TYPE0", "name": "Type 0", "regexp": ["reg_0", "reg_1"]},
+                    {"code": "TYPE1", "name": "Type 1", "regexp": []}]},
+                {"code": "GROUP1", "name": "Group 1", "types": []},
+                {"code": "", "name": "", "types": [
+                    {"code": "TYPE2", "name": "Type 2", "regexp": ["reg_2"]}]}]
+        _other = [
+                {"code": "GROUP0", "name": "Group 0", "types": [
+                    {"code": "TYPE0", "name": "Type 0", "regexp": ["reg_1", "reg_0"]},
+                    {"code": "TYPE2", "name": "Type 2", "regexp": ["reg_2", "reg_3"]}]},
+                {"code": "GROUP2", "name": "Group 2", "types": []},
+                {"code": "", "name": "", "types": [
+                    {"code": "TYPE3", "name": "Type 3", "regexp": []}]}]
+        _expected = [{"reference": "dl", "schema": "cnt", "rows": [
+            {"kind": "Groups", "code": "", "missing": ["GROUP1"], "extra": ["GROUP2"]},
+            {"kind": "Types", "code": "", "missing": ["TYPE1"], "extra": ["TYPE3"]},
+            {"kind": "Type groups", "code": "TYPE2", "missing": [], "extra": ["GROUP0"]},
+            {"kind": "Type regexps", "code": "TYPE2", "missing": [], "extra": ["reg_3"]}]}]
+
+        return _reference, _other, _expected
+
+    def test_compare_reports(self):
+        _ts = CiTypesSync()
+        _reference, _other, _expected = self.__compare_data()
+        self.assertEqual(_expected, _ts._compare_reports({"dl": _reference, "cnt": _other}))
+        self.assertEqual([{"reference": "dl", "schema": "cnt", "rows": []}],
+                _ts._compare_reports({"dl": _reference, "cnt": _reference}))
+
+    def test_get_source_reports(self):
+        # two SQLite databases extracted concurrently
+        _ts = CiTypesSync()
+        _reference, _other, _expected = self.__compare_data()
+
+        with tempfile.TemporaryDirectory() as _tmpdir:
+            sqlite_fixture.add_database("dl", os.path.join(_tmpdir, "dl.sqlite3"), _reference)
+            _models = sqlite_fixture.add_database("cnt", os.path.join(_tmpdir, "cnt.sqlite3"), _other)
+            _reports = _ts._get_source_reports(_models, {"dl": "dl", "cnt": "cnt"})
+
+        self.assertEqual(["dl", "cnt"], list(_reports.keys()))
+        self.assertEqual(["GROUP0", "GROUP1", ""], list(map(lambda x: x.get("code"), _reports["dl"])))
+        self.assertEqual(["TYPE0", "TYPE1"], list(map(lambda x: x.get("code"), _reports["dl"][0]["types"])))
+        self.assertEqual(["reg_2", "reg_3"], sorted(_reports["cnt"][0]["types"][1]["regexp"]))
+        self.assertEqual(_expected, _ts._compare_reports(_reports))
+
+    def test_render_template_consistency(self):
+        # consistency section is rendered on the page only if schemas are compared
+        _ts = CiTypesSync()
+        _ts._args = unittest.mock.MagicMock()
+        _ts._args.page_template = CiTypesSync().basic_args().parse_args([]).page_template
+        _ts._args.mvn_prefix = "prefix"
+        _reference, _other, _expected = self.__compare_data()
+        self.assertNotIn("Schemas consistency", _ts._render_template(_ts._make_context(_reference)))
+        _page = _ts._render_template(_ts._make_context(_reference, _expected))
+        self.assertIn("Schemas consistency", _page)
+        self.assertIn("<li>reg_3</li>", _page)
+        _page = _ts._render_template(_ts._make_context(_reference, [{"reference": "dl", "schema": "cnt", "rows": []}]))
+        self.assertIn("No differences found.", _page)
 
     def test_get_confluence_page_id(self):
         _ts = CiTypesSync()
@@ -290,50 +407,81 @@ class OcConfluenceCiTypeSyncTest(unittest.TestCase):
                     headers={"Content-type": "application/json"},
                     auth=("test_user", "test_password"))
 
-    def test_get_page_current_content(self):
+    def test_get_page_state(self):
         _ts = CiTypesSync()
         _ts._args = unittest.mock.MagicMock()
         _ts._args.wiki_url = "https://confluence.example.com"
         _ts._args.wiki_user = "test_user"
         _ts._args.wiki_password = "test_password"
-        _ts._args.page_title = "Test Page 3"
+        _ts._args.page_property = "test-property"
 
         with unittest.mock.patch("requests.get") as _rqp:
-
             with self.assertRaises(MockHttpException):
                 _rqp.return_value = MockHttpResponse(403)
-                _ts._get_page_current_content("12")
+                _ts._get_page_state("12")
 
             _rqp.reset_mock()
-            _rqp.return_value = MockHttpResponse(200, json_ret={"content": "test_content"})
-            self.assertEqual({"content": "test_content"}, _ts._get_page_current_content("12"))
+            _rqp.return_value = MockHttpResponse(200, json_ret={"version": {"number": "10"}})
+            self.assertEqual({"version": {"number": "10"}}, _ts._get_page_state("12"))
 
             _rqp.assert_called_once_with("https://confluence.example.com/rest/api/content/12",
-                    params={"expand": "body.storage"},
+                    params={"expand": "version,metadata.properties.test-property"},
                     headers={"Content-type": "application/json"},
                     auth=("test_user", "test_password"))
 
-    def test_get_page_new_version(self):
+    def test_get_page_marker(self):
+        _ts = CiTypesSync()
+        _ts._args = unittest.mock.MagicMock()
+        _ts._args.page_property = "test-property"
+
+        self.assertIsNone(_ts._get_page_marker({"id": "12"}))
+        self.assertIsNone(_ts._get_page_marker({"id": "12", "metadata": {"properties": {}}}))
+        self.assertEqual({"hash": "the_hash"}, _ts._get_page_marker({"id": "12", "metadata": {"properties": {
+            "test-property": {"key": "test-property", "value": {"hash": "the_hash"}, "version": {"number": 3}}}}}))
+
+    def test_get_page_property(self):
+        _ts = CiTypesSync()
+        _ts._args = unittest.mock.MagicMock()
+        _ts._args.page_property = "test-property"
+        _property = {"key": "test-property", "value": {"hash": "the_hash"}, "version": {"number": 3}}
+
+        self.assertIsNone(_ts._get_page_property({"id": "12"}))
+        self.assertIsNone(_ts._get_page_property({"id": "12", "metadata": {"properties": {}}}))
+        self.assertEqual(_property, _ts._get_page_property({"id": "12", "metadata": {"properties": {
+            "test-property": _property}}}))
+
+    def test_put_page_property(self):
         _ts = CiTypesSync()
         _ts._args = unittest.mock.MagicMock()
         _ts._args.wiki_url = "https://confluence.example.com"
         _ts._args.wiki_user = "test_user"
         _ts._args.wiki_password = "test_password"
-        _ts._args.page_title = "Test Page 3"
+        _ts._args.page_property = "test-property"
+        _headers = {"Content-type": "application/json"}
+
+        # absent: created, current property is not requested again
+        with unittest.mock.patch("requests.get") as _rqg, unittest.mock.patch("requests.post") as _rqp:
+            _rqp.return_value = MockHttpResponse(200)
+            _ts._put_page_property("12", {"hash": "the_hash"})
+            _rqg.assert_not_called()
+            _rqp.assert_called_once_with("https://confluence.example.com/rest/api/content/12/property",
+                    headers=_headers, auth=("test_user", "test_password"),
+                    data=json.dumps({"key": "test-property", "value": {"hash": "the_hash"}}))
+
+        # present: updated with version incremented
+        with unittest.mock.patch("requests.get") as _rqg, unittest.mock.patch("requests.put") as _rqp:
+            _rqp.return_value = MockHttpResponse(200)
+            _ts._put_page_property("12", {"hash": "the_hash"}, {"key": "test-property", "version": {"number": 3}})
+            _rqg.assert_not_called()
+            _rqp.assert_called_once_with(
+                    "https://confluence.example.com/rest/api/content/12/property/test-property",
+                    headers=_headers, auth=("test_user", "test_password"),
+                    data=json.dumps({"key": "test-property", "value": {"hash": "the_hash"},
+                        "version": {"number": 4, "minorEdit": True}}))
 
-        with unittest.mock.patch("requests.get") as _rqp:
             with self.assertRaises(MockHttpException):
-                _rqp.return_value = MockHttpResponse(403)
-                _ts._get_page_new_version("12")
-
-            _rqp.reset_mock()
-            _rqp.return_value = MockHttpResponse(200, json_ret={"version": {"number": "10"}})
-            self.assertEqual("11", _ts._get_page_new_version("12"))
-
-            _rqp.assert_called_once_with("https://confluence.example.com/rest/api/content/12",
-                    params={"expand": "version.number"},
-                    headers={"Content-type": "application/json"},
-                    auth=("test_user", "test_password"))
+                _rqp.return_value = MockHttpResponse(409)
+                _ts._put_page_property("12", {"hash": "the_hash"}, {"key": "test-property", "version": {"number": 3}})
 
     def test_make_new_page_object(self):
         _ts = CiTypesSync()
@@ -358,6 +506,11 @@ class OcConfluenceCiTypeSyncTest(unittest.TestCase):
 
         self.assertEqual(_ts._make_new_page_object(_current, "10", "current_test_body"), _expected)
 
+        # page state without body
+        del(_current["body"])
+        _current["extra"] = "test_extra"
+        self.assertEqual(_ts._make_new_page_object(_current, "10", "current_test_body"), _expected)
+
     def test_put_to_confluence(self):
         _ts = CiTypesSync()
         _ts._args = unittest.mock.MagicMock()
@@ -384,10 +537,13 @@ class OcConfluenceCiTypeSyncTest(unittest.TestCase):
         _ts = CiTypesSync()
         _ts._args = unittest.mock.MagicMock()
         _ts._get_confluence_page_id = unittest.mock.MagicMock(return_value="1")
-        _ts._get_page_current_content = unittest.mock.MagicMock(return_value="the_content")
-        _ts._get_page_new_version = unittest.mock.MagicMock(return_value="2")
+        _ts._get_page_state = unittest.mock.MagicMock(return_value={"id": "1", "version": {"number": 1}})
         _ts._make_new_page_object = unittest.mock.MagicMock(return_value="the object")
         _ts._put_to_confluence = unittest.mock.MagicMock()
+        _ts._put_page_property = unittest.mock.MagicMock()
+        _ts._make_report_marker = unittest.mock.MagicMock(return_value={"hash": "new", "schema": 1})
+        _ts._get_page_marker = unittest.mock.MagicMock(return_value={"hash": "old", "schema": 1})
+        _ts._get_page_property = unittest.mock.MagicMock(return_value="the_property")
 
         # write to file
         _out = tempfile.NamedTemporaryFile()
@@ -399,29 +555,172 @@ class OcConfluenceCiTypeSyncTest(unittest.TestCase):
 
         _out.close()
         _ts._get_confluence_page_id.assert_not_called()
-        _ts._get_page_current_content.assert_not_called()
-        _ts._get_page_new_version.assert_not_called()
+        _ts._get_page_state.assert_not_called()
         _ts._make_new_page_object.assert_not_called()
         _ts._put_to_confluence.assert_not_called()
+        _ts._put_page_property.assert_not_called()
 
         # put to server
         _ts._args.fn_out = None
         _ts._args.page_title = "Test Page"
         _ts._save_report("report string")
         _ts._get_confluence_page_id.assert_called_once()
-        _ts._get_page_current_content.assert_called_once_with("1")
-        _ts._get_page_new_version.assert_called_once_with("1")
-        _ts._make_new_page_object.assert_called_once_with("the_content", "2", "report string")
+        _ts._get_page_state.assert_called_once_with("1")
+        _ts._get_page_marker.assert_called_once_with({"id": "1", "version": {"number": 1}})
+        _ts._make_new_page_object.assert_called_once_with({"id": "1", "version": {"number": 1}}, "2", "report string")
+        _ts._put_to_confluence.assert_called_once_with("1", "the object")
+        _ts._put_page_property.assert_called_once_with("1", {"hash": "new", "schema": 1}, "the_property")
+
+        # not changed
+        _ts._put_to_confluence.reset_mock()
+        _ts._put_page_property.reset_mock()
+        _ts._get_page_marker.return_value = {"hash": "new", "schema": 1, "db": "other"}
+        _ts._save_report("report string")
+        _ts._put_to_confluence.assert_not_called()
+        _ts._put_page_property.assert_not_called()
+
+        # report schema changed
+        _ts._get_page_marker.return_value = {"hash": "new", "schema": 0}
+        _ts._save_report("report string")
         _ts._put_to_confluence.assert_called_once_with("1", "the object")
+        _ts._put_page_property.assert_called_once_with("1", {"hash": "new", "schema": 1}, "the_property")
 
+        # page is not saved: no marker
+        _ts._put_page_property.reset_mock()
+        _ts._put_to_confluence.side_effect = MockHttpException(409)
 
-    def test_run(self):
+        with self.assertRaises(MockHttpException):
+            _ts._save_report("report string")
+
+        _ts._put_page_property.assert_not_called()
+
+    def test_save_report_marker(self):
         _ts = CiTypesSync()
-        _args = unittest.mock.MagicMock()
+        _ts._args = unittest.mock.MagicMock()
+        _ts._args.fn_out = None
+        _ts._args.wiki_user = "test_user"
+        _ts._args.wiki_password = "test_password"
+        _ts._args.page_title = "Test Page"
+        _ts._args.page_property = "test-property"
+        _ts._db_fingerprint = "the_fingerprint"
+
+        with ConfluenceStub() as _stub:
+            _page_id = _stub.add_page("Test Page", "old body" * 1000)
+            _ts._args.wiki_url = _stub.url
+            self.assertIsNone(_ts._get_page_marker(_ts._get_page_state(_page_id)))
+
+            # the page body is neither downloaded nor sent with metadata, the property is created separately
+            _stub.requests.clear()
+            _ts._save_report("report string")
+            self.assertEqual([("GET", "/rest/api/content"), ("GET", "/rest/api/content/%s" % _page_id),
+                ("PUT", "/rest/api/content/%s" % _page_id),
+                ("POST", "/rest/api/content/%s/property" % _page_id)],
+                [(_r["method"], _r["path"]) for _r in _stub.requests])
+            self.assertTrue(all(_r["sent"] < 500 for _r in _stub.requests if _r["method"] == "GET"))
+            _page = _stub.pages[_page_id]
+            self.assertEqual("report string", _page["body"]["storage"]["value"])
+            self.assertEqual(2, _page["version"]["number"])
+            self.assertEqual({"hash": hashlib.sha256(b"report string").hexdigest(),
+                "schema": REPORT_SCHEMA_VERSION, "db": "the_fingerprint"}, _page["properties"]["test-property"]["value"])
+            self.assertEqual(1, _page["properties"]["test-property"]["version"]["number"])
+            self.assertEqual(_page["properties"]["test-property"]["value"],
+                    _ts._get_page_marker(_ts._get_page_state(_page_id)))
+
+            # the same report: no body is transferred either way
+            _stub.requests.clear()
+            _ts._save_report("report string")
+            self.assertEqual(["GET", "GET"], [_r["method"] for _r in _stub.requests])
+            self.assertNotIn("report string", json.dumps(_stub.requests))
+            self.assertLess(_stub.requests[1]["sent"], 500)
+            self.assertEqual(2, _page["version"]["number"])
+
+            # property version is incremented, taken from the page state request
+            _stub.requests.clear()
+            _ts._save_report("new report string")
+            self.assertEqual([("GET", "/rest/api/content"), ("GET", "/rest/api/content/%s" % _page_id),
+                ("PUT", "/rest/api/content/%s" % _page_id),
+                ("PUT", "/rest/api/content/%s/property/test-property" % _page_id)],
+                [(_r["method"], _r["path"]) for _r in _stub.requests])
+            self.assertEqual("new report string", _page["body"]["storage"]["value"])
+            self.assertEqual(3, _page["version"]["number"])
+            self.assertEqual(2, _page["properties"]["test-property"]["version"]["number"])
+            self.assertEqual(hashlib.sha256(b"new report string").hexdigest(),
+                    _page["properties"]["test-property"]["value"]["hash"])
+
+    def test_get_db_fingerprint(self):
+        _ts = CiTypesSync()
+        _reference, _other, _expected = self.__compare_data()
+
+        with tempfile.TemporaryDirectory() as _tmpdir:
+            sqlite_fixture.add_database("fp_dl", os.path.join(_tmpdir, "dl.sqlite3"), _reference)
+            _models = sqlite_fixture.add_database("fp_cnt", os.path.join(_tmpdir, "cnt.sqlite3"), _other)
+            _fingerprint = _ts._get_db_fingerprint(_ModelsOnDatabase(_models, "fp_dl"))
+            self.assertEqual(_fingerprint, _ts._get_db_fingerprint(_ModelsOnDatabase(_models, "fp_dl")))
+            self.assertNotEqual(_fingerprint, _ts._get_db_fingerprint(_ModelsOnDatabase(_models, "fp_cnt")))
+
+    def test_save_report_attachment(self):
+        _ts = CiTypesSync()
+        _ts._args = unittest.mock.MagicMock()
+        _ts._args.wiki_user = "test_user"
+        _ts._args.wiki_password = "test_password"
+        _ts._args.page_title = "Test Page"
+        _ts._args.regexp_attachment = "regexps.json.gz"
+        _ts._args.page_property = "test-property"
+        _attachment = _ts._make_regexp_catalogue([{"code": "", "types": [{"code": "TYPE0", "regexp": ["reg_0"]}]}])
+
+        # write to file: attachment is put near
+        with tempfile.TemporaryDirectory() as _tmpdir:
+            _ts._args.fn_out = os.path.join(_tmpdir, "report.xhtml")
+            _ts._save_report("report string", _attachment)
+
+            with open(os.path.join(_tmpdir, "regexps.json.gz"), mode='rb') as _t:
+                self.assertEqual(_attachment.get("data"), _t.read())
+
+        _ts._args.fn_out = None
+
+        with ConfluenceStub() as _stub:
+            _page_id = _stub.add_page("Test Page", "old body")
+            _ts._args.wiki_url = _stub.url
+
+            # new attachment is uploaded before the page
+            _ts._save_report("report string", _attachment)
+            self.assertEqual(["GET", "GET", "POST", "GET", "PUT", "POST"], [_r["method"] for _r in _stub.requests])
+            self.assertEqual(_attachment.get("data"), _stub.attachments[_page_id]["regexps.json.gz"]["data"])
+            self.assertEqual("report string", _stub.pages[_page_id]["body"]["storage"]["value"])
+
+            # not changed: no upload
+            _stub.requests.clear()
+            _ts._save_report("report string", _attachment)
+            self.assertEqual(["GET", "GET", "GET"], [_r["method"] for _r in _stub.requests])
+
+            # changed: new version of the same attachment
+            _changed = _ts._make_regexp_catalogue([{"code": "", "types": [{"code": "TYPE0", "regexp": ["reg_1"]}]}])
+            _ts._save_report("report string", _changed)
+            _uploaded = _stub.attachments[_page_id]["regexps.json.gz"]
+            self.assertEqual(2, _uploaded["version"])
+            self.assertEqual(_changed.get("data"), _uploaded["data"])
+            self.assertEqual("sha256:%s" % _changed.get("hash"), _uploaded["comment"])
+            self.assertEqual(1, len(_stub.attachments[_page_id]))
+
+    def __run_args(self, **kwargs):
+        # defaults as parsed from empty command line and environment, with those given overridden
+        with unittest.mock.patch.dict(os.environ, clear=True):
+            _args = CiTypesSync().basic_args().parse_args([])
+
         _args.page_template = "the_page.template"
 
+        for _k, _v in kwargs.items():
+            setattr(_args, _k, _v)
+
+        return _args
+
+    def test_run(self):
+        _ts = CiTypesSync()
+        _args = self.__run_args()
+
         _models = unittest.mock.MagicMock()
         _ts._do_orm_initialization = unittest.mock.MagicMock(return_value=_models)
+        _ts._get_db_fingerprint = unittest.mock.MagicMock(return_value="the_fingerprint")
         _ts._get_citype_groups = unittest.mock.MagicMock(return_value="the_report")
         _ts._make_context = unittest.mock.MagicMock(return_value="the_context")
         _ts._render_template = unittest.mock.MagicMock(return_value="the_rendered_template")
@@ -432,7 +731,161 @@ class OcConfluenceCiTypeSyncTest(unittest.TestCase):
         self.assertEqual(_ts._args.page_template, os.path.abspath("the_page.template"))
 
         _ts._do_orm_initialization.assert_called_once()
+        _ts._get_db_fingerprint.assert_called_once_with(_models)
+        self.assertEqual("the_fingerprint", _ts._db_fingerprint)
         _ts._get_citype_groups.assert_called_once_with(_models)
         _ts._make_context.assert_called_once_with("the_report")
         _ts._render_template.assert_called_once_with("the_context")
         _ts._save_report.assert_called_once_with("the_rendered_template")
+
+    def test_run_regexp_attachment(self):
+        _ts = CiTypesSync()
+        _args = self.__run_args(regexp_attachment="regexps.json.gz")
+
+        _ts._do_orm_initialization = unittest.mock.MagicMock(return_value="the_models")
+        _ts._get_db_fingerprint = unittest.mock.MagicMock(return_value="the_fingerprint")
+        _ts._get_citype_groups = unittest.mock.MagicMock(return_value="the_report")
+        _ts._make_regexp_catalogue = unittest.mock.MagicMock(return_value="the_attachment")
+        _ts._render_template = unittest.mock.MagicMock(return_value="the_rendered_template")
+        _ts._save_report = unittest.mock.MagicMock()
+
+        _ts.run(_args)
+        _ts._make_regexp_catalogue.assert_called_once_with("the_report")
+        _ts._save_report.assert_called_once_with("the_rendered_template", "the_attachment")
+
+    def test_run_serve(self):
+        _ts = CiTypesSync()
+        _args = self.__run_args(serve_port=8080)
+
+        _ts._do_orm_initialization = unittest.mock.MagicMock(return_value="the_models")
+        _ts._serve = unittest.mock.MagicMock()
+        _ts._get_citype_groups = unittest.mock.MagicMock()
+        _ts._save_report = unittest.mock.MagicMock()
+
+        _ts.run(_args)
+        _ts._serve.assert_called_once_with("the_models")
+        _ts._get_citype_groups.assert_not_called()
+        _ts._save_report.assert_not_called()
+
+    def test_serve(self):
+        sqlite_fixture.setup_django()
+        _ts = CiTypesSync()
+        _ts._args = unittest.mock.MagicMock()
+        _ts._args.serve_port = 8080
+        _ts._args.serve_ttl = 10
+        _ts._args.serve_check_interval = 1
+        _ts._get_citype_groups = unittest.mock.MagicMock(return_value="the_report")
+        _ts._get_db_fingerprint = unittest.mock.MagicMock(return_value="the_fingerprint")
+
+        with unittest.mock.patch("oc_confluence_ci_type_sync.ci_types_sync.CatalogueServer") as _server:
+            _ts._serve("the_models")
+            _server.assert_called_once_with(unittest.mock.ANY, unittest.mock.ANY,
+                    ttl=10, check_interval=1, address=("", 8080))
+            _server.return_value.serve_forever.assert_called_once()
+            _loader, _fingerprinter = _server.call_args[0]
+
+        self.assertEqual("the_report", _loader())
+        self.assertEqual("the_fingerprint", _fingerprinter())
+        _ts._get_citype_groups.assert_called_once_with("the_models")
+        _ts._get_db_fingerprint.assert_called_once_with("the_models")
+
+    def test_run_digest(self):
+        _ts = CiTypesSync()
+        _args = self.__run_args(digest=True)
+
+        _ts._do_orm_initialization = unittest.mock.MagicMock(return_value="the_models")
+        _ts._get_db_fingerprint = unittest.mock.MagicMock(return_value="the_fingerprint")
+        _ts._get_citype_groups = unittest.mock.MagicMock(return_value=[{"code": "", "types": []}])
+        _ts._render_template = unittest.mock.MagicMock()
+        _ts._save_report = unittest.mock.MagicMock()
+
+        with unittest.mock.patch("builtins.print") as _print:
+            _ts.run(_args)
+            _print.assert_called_once_with(get_report_digest([{"code": "", "types": []}]))
+
+        _ts._render_template.assert_not_called()
+        _ts._save_report.assert_not_called()
+
+    def test_run_profile(self):
+        _ts = CiTypesSync()
+        _args = self.__run_args()
+
+        _ts._do_orm_initialization = unittest.mock.MagicMock(return_value="the_models")
+        _ts._get_db_fingerprint = unittest.mock.MagicMock(return_value="the_fingerprint")
+        _ts._get_citype_groups = unittest.mock.MagicMock(return_value=[{"code": "", "types": []}])
+        _ts._render_template = unittest.mock.MagicMock(side_effect=lambda x: "x" * 100000)
+        _ts._save_report = unittest.mock.MagicMock()
+
+        with tempfile.TemporaryDirectory() as _tmpdir:
+            _args.profile = os.path.join(_tmpdir, "profile")
+            _ts.run(_args)
+            _ts._get_citype_groups.assert_called_once_with("the_models")
+            _ts._save_report.assert_called_once_with("x" * 100000)
+
+            _phases = ["01-orm_init", "02-get_citype_groups", "03-render_template", "04-save_report"]
+            self.assertEqual(sorted([_p + ".pstats" for _p in _phases] + [_p + ".txt" for _p in _phases]),
+                    sorted(os.listdir(_args.profile)))
+
+            with open(os.path.join(_args.profile, "03-render_template.txt"), mode="rt") as _summary:
+                _summary = _summary.read()
+
+        self.assertIn("Phase: render_template", _summary)
+        self.assertIn("functions by cumulative time", _summary)
+        # the rendered string is at least 100000 bytes
+        _peak = int(_summary.split("Peak allocation: ")[1].split()[0])
+        self.assertGreaterEqual(_peak, 100000)
+
+    def test_run_profile_compare(self):
+        # extraction is profiled in each worker thread
+        _ts = CiTypesSync()
+        _args = self.__run_args(psql_url="dl")
+        _reference, _other, _expected = self.__compare_data()
+
+        _ts._get_db_fingerprint = unittest.mock.MagicMock(return_value="the_fingerprint")
+        _ts._get_sources = unittest.mock.MagicMock(return_value={"dl": "prof_dl", "cnt": "prof_cnt"})
+        _ts._render_template = unittest.mock.MagicMock(return_value="the_rendered_template")
+        _ts._save_report = unittest.mock.MagicMock()
+
+        with tempfile.TemporaryDirectory() as _tmpdir:
+            sqlite_fixture.add_database("prof_dl", os.path.join(_tmpdir, "dl.sqlite3"), _reference)
+            _models = sqlite_fixture.add_database("prof_cnt", os.path.join(_tmpdir, "cnt.sqlite3"), _other)
+            _ts._do_orm_initialization = unittest.mock.MagicMock(return_value=_models)
+            _args.profile = os.path.join(_tmpdir, "profile")
+            _ts.run(_args)
+
+            # workers are numbered in the order they start
+            _phases = dict((_f.split(".")[0][3:], _f) for _f in os.listdir(_args.profile) if _f.endswith(".txt"))
+            self.assertEqual(["get_citype_groups-prof_cnt", "get_citype_groups-prof_dl", "orm_init",
+                "render_template", "save_report"], sorted(_phases.keys()))
+
+            for _alias in ["prof_dl", "prof_cnt"]:
+                with open(os.path.join(_args.profile, _phases["get_citype_groups-%s" % _alias]), mode="rt") as _summary:
+                    # the extraction itself is seen, not waiting for workers
+                    self.assertIn("_get_citype_regexps", _summary.read())
+
+        _ts._render_template.assert_called_once()
+        self.assertEqual(_expected, _ts._render_template.call_args[0][0]["consistency"])
+        _ts._save_report.assert_called_once_with("the_rendered_template")
+
+    def test_run_compare(self):
+        _ts = CiTypesSync()
+        _args = self.__run_args(psql_url="dl")
+
+        _models = unittest.mock.MagicMock()
+        _ts._do_orm_initialization = unittest.mock.MagicMock(return_value=_models)
+        _ts._get_db_fingerprint = unittest.mock.MagicMock(return_value="the_fingerprint")
+        _ts._get_sources = unittest.mock.MagicMock(return_value={"dl": "default", "cnt": "compare_1"})
+        _ts._get_source_reports = unittest.mock.MagicMock(return_value={"dl": "the_report", "cnt": "other_report"})
+        _ts._get_citype_groups = unittest.mock.MagicMock()
+        _ts._compare_reports = unittest.mock.MagicMock(return_value="the_consistency")
+        _ts._make_context = unittest.mock.MagicMock(return_value="the_context")
+        _ts._render_template = unittest.mock.MagicMock(return_value="the_rendered_template")
+        _ts._save_report = unittest.mock.MagicMock()
+
+        _ts.run(_args)
+        _ts._get_source_reports.assert_called_once_with(_models, {"dl": "default", "cnt": "compare_1"})
+        _ts._get_citype_groups.assert_not_called()
+        _ts._compare_reports.assert_called_once_with({"dl": "the_report", "cnt": "other_report"})
+        _ts._make_context.assert_called_once_with("the_report", "the_consistency")
+        _ts._render_template.assert_called_once_with("the_context")
+        _ts._save_report.assert_called_once_with("the_rendered_template")
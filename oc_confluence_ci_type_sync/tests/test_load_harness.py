@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+
+import unittest
+import time
+from oc_confluence_ci_type_sync.tests.load_harness import run_harness, format_results, make_groups
+from oc_confluence_ci_type_sync.tests.confluence_stub import ConfluenceStub
+import requests
+
+# remove unnecessary log output
+import logging
+logging.getLogger().propagate = False
+logging.getLogger().disabled = True
+
+class LoadHarnessTest(unittest.TestCase):
+    def test_make_groups(self):
+        _groups = make_groups(25, 2)
+        self.assertEqual(["GROUP0", "GROUP1", ""], [_g.get("code") for _g in _groups])
+        self.assertEqual(25, sum(len(_g.get("types")) for _g in _groups))
+        self.assertEqual(2, len(_groups[2]["types"][4]["regexp"]))
+
+    def test_stub_latency_and_bandwidth(self):
+        with ConfluenceStub(latency=0.1) as _stub:
+            _page_id = _stub.add_page("Test Page", "x" * 10000)
+            _started = time.perf_counter()
+            requests.get(_stub.url + "rest/api/content/" + _page_id)
+            self.assertGreaterEqual(time.perf_counter() - _started, 0.1)
+
+            _stub.latency = 0.0
+            _stub.bandwidth = 50000
+            _started = time.perf_counter()
+            _resp = requests.get(_stub.url + "rest/api/content/" + _page_id, params={"expand": "body.storage"})
+            self.assertGreaterEqual(time.perf_counter() - _started, 0.2)
+            self.assertEqual("x" * 10000, _resp.json()["body"]["storage"]["value"])
+
+            # connections reuse is counted
+            with requests.Session() as _session:
+                _stub.bandwidth = None
+                _session.get(_stub.url + "rest/api/content/" + _page_id)
+                _session.get(_stub.url + "rest/api/content/" + _page_id)
+
+            self.assertEqual({"requests": 4, "connections": 3, "errors": 0}, dict(
+                (_k, _v) for _k, _v in _stub.stats().items() if _k in ["requests", "connections", "errors"]))
+
+    def test_stub_error_rate(self):
+        with ConfluenceStub(error_rate=1.0) as _stub:
+            _resp = requests.get(_stub.url + "rest/api/content", params={"title": "Test Page"})
+            self.assertEqual(503, _resp.status_code)
+            self.assertEqual(1, _stub.stats().get("errors"))
+
+    def test_run_harness(self):
+        _results = run_harness(types=50, regexps=2, runs=2)
+        self.assertEqual(2, len(_results))
+
+        for _result in _results:
+            self.assertIsNone(_result.get("error"))
+            self.assertEqual(["orm_init", "get_citype_groups", "render_template", "save_report"],
+                    list(_result.get("phases").keys()))
+
+        # the first run publishes the page, the second one has nothing to transfer
+        self.assertEqual(4, _results[0].get("requests"))
+        self.assertEqual(2, _results[1].get("requests"))
+        self.assertGreater(_results[0].get("received"), 10000)
+        self.assertEqual(0, _results[1].get("received"))
+        self.assertIn("save_report", format_results(_results))
+
+    def test_run_harness_errors(self):
+        _results = run_harness(types=5, regexps=1, runs=1, error_rate=1.0)
+        self.assertIn("503", _results[0].get("error"))
+        self.assertEqual(1, _results[0].get("errors"))
+        self.assertIn("error: ", format_results(_results))
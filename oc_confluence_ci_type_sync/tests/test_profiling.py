@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+
+import unittest
+from oc_confluence_ci_type_sync.profiling import PhaseProfiler
+import os
+import tempfile
+import time
+
+# remove unnecessary log output
+import logging
+logging.getLogger().propagate = False
+logging.getLogger().disabled = True
+
+def _temporary_allocation():
+    # the buffer is freed before the phase ends
+    _buffer = [str(_i) for _i in range(0, 100000)]
+    time.sleep(0.2)
+    return len(_buffer)
+
+class PhaseProfilerTest(unittest.TestCase):
+    def test_call(self):
+        with tempfile.TemporaryDirectory() as _tmpdir:
+            _profiler = PhaseProfiler(_tmpdir, top=5)
+            self.assertEqual(100000, _profiler.call("temporary", _temporary_allocation))
+            self.assertEqual(["01-temporary.pstats", "01-temporary.txt"], sorted(os.listdir(_tmpdir)))
+
+            with open(os.path.join(_tmpdir, "01-temporary.txt"), mode="rt") as _summary:
+                _summary = _summary.read()
+
+        _peak = int(_summary.split("Peak allocation: ")[1].split()[0])
+        self.assertGreater(_peak, 1000000)
+        _at_peak, _retained = _summary.split("retained at the end of the phase:")
+        _at_peak = _at_peak.split("at the largest sampled allocation")[1]
+        _retained = _retained.split("functions by cumulative time")[0]
+
+        # the temporary buffer is the top site at peak and is not retained
+        self.assertGreater(int(_at_peak.split(" (")[1].split()[0]), _peak / 2)
+        _top_site = _at_peak.split("\n")[1]
+        self.assertIn("test_profiling.py:16: size=", _top_site)
+        self.assertGreater(int(_top_site.split("count=")[1].split(",")[0]), 50000)
+
+        for _site in filter(None, _retained.split("\n")[1:-2]):
+            self.assertLess(int(_site.split("count=")[1].split(",")[0]), 1000)
+        # profiling itself is excluded
+        self.assertNotIn("/profiling.py:", _at_peak)
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+
+import unittest
+import unittest.mock
+from oc_confluence_ci_type_sync.ci_types_sync import CiTypesSync
+from oc_confluence_ci_type_sync.table_renderer import render_groups_table
+import os
+import json
+import time
+
+# remove unnecessary log output
+import logging
+logging.getLogger().propagate = False
+logging.getLogger().disabled = True
+
+_templates_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_data", "render_template")
+
+def _make_groups(rows):
+    """
+    Generate report with number of table rows given, including empty groups, types without regexps
+    and non-groupped types
+    :param int rows: number of table rows
+    :return list: report
+    """
+    _result = list()
+    _types_count = 0
+
+    while _types_count < rows:
+        _group_index = len(_result)
+        _types = list()
+
+        # every seventh group is empty, others have up to 9 types
+        for _it in range(0, (_group_index % 10) if _group_index % 7 else 0):
+            _types.append({"code": "TYPE%d" % _types_count, "name": "Type %d" % _types_count,
+                "standard": "Yes" if _types_count % 2 else "No", "deliverable": "No" if _types_count % 3 else "Yes",
+                "regexp": ["regexp_%d_%d" % (_types_count, _ir) for _ir in range(0, _types_count % 4)],
+                "rowspan": 1})
+            _types_count += 1
+
+        _result.append({"code": "GROUP%d" % _group_index, "name": "Group %d" % _group_index,
+            "types": _types, "rowspan": len(_types) or 1})
+        _types_count += 0 if _types else 1
+
+    _result.append({"code": "", "name": "", "types": [
+        {"code": "FREE", "name": "Free type", "standard": "No", "deliverable": "No", "regexp": [], "rowspan": 1}],
+        "rowspan": 1})
+    return _result
+
+class TableRendererTest(unittest.TestCase):
+    def __sync(self, fast_render, page_template=None):
+        _ts = CiTypesSync()
+        _ts._args = unittest.mock.MagicMock()
+        _ts._args.page_template = page_template or CiTypesSync().basic_args().parse_args([]).page_template
+        _ts._args.mvn_prefix = "prefix"
+        _ts._args.fast_render = fast_render
+        return _ts
+
+    def test_render_groups_table(self):
+        # the test template has the same table rows as the page one
+        with open(os.path.join(_templates_dir, "test_data.json"), mode='rt') as _f:
+            _context = json.load(_f)
+
+        _ts = self.__sync(False, os.path.join(_templates_dir, "test.html.template"))
+        _rendered = _ts._render_template(_context)
+        _begin = _rendered.index("<tbody>\n     ") + len("<tbody>\n     ")
+        _end = _rendered.index("\n    </tbody>")
+        self.assertEqual(_rendered[_begin:_end], render_groups_table(_context.get("groups")))
+
+    def test_render_groups_table_empty(self):
+        self.assertEqual("", render_groups_table([]))
+        # absent values are rendered empty, as Jinja2 does
+        self.assertIn('<td rowspan="">GROUP</td>', render_groups_table([{"code": "GROUP", "types": []}]))
+
+    def test_render_template_parity(self):
+        _context = {"mvn_prefix": "prefix", "groups": _make_groups(300)}
+        self.assertEqual(self.__sync(False)._render_template(_context), self.__sync(True)._render_template(_context))
+
+    def test_render_template_parity_regexp_attachment(self):
+        _context = {"mvn_prefix": "prefix", "groups": _make_groups(300), "regexp_attachment": "regexps.json.gz"}
+        _rendered = self.__sync(False)._render_template(_context)
+        self.assertEqual(_rendered, self.__sync(True)._render_template(_context))
+        self.assertNotIn("<li>regexp_", _rendered)
+        self.assertIn('3 (<ac:link><ri:attachment ri:filename="regexps.json.gz"/></ac:link>)', _rendered)
+
+    def __render_timed(self, fast_render, context):
+        _ts = self.__sync(fast_render)
+        _started = time.perf_counter()
+        _rendered = _ts._render_template(context)
+        return _rendered, time.perf_counter() - _started
+
+    def __benchmark(self, rows):
+        _context = {"mvn_prefix": "prefix", "groups": _make_groups(rows)}
+        _jinja_rendered, _jinja_time = self.__render_timed(False, _context)
+        _native_rendered, _native_time = self.__render_timed(True, _context)
+        self.assertEqual(_jinja_rendered, _native_rendered)
+        self.assertLessEqual(_native_time, _jinja_time)
+        print("\nRendering of %d rows: Jinja2 %.3f s, native %.3f s" % (rows, _jinja_time, _native_time))
+
+    @unittest.skipUnless(os.getenv("OC_BENCHMARK"), "set OC_BENCHMARK to run benchmarks")
+    def test_benchmark_10k(self):
+        self.__benchmark(10000)
+
+    @unittest.skipUnless(os.getenv("OC_BENCHMARK"), "set OC_BENCHMARK to run benchmarks")
+    def test_benchmark_100k(self):
+        self.__benchmark(100000)